@@ -0,0 +1,121 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from timing import wall_clock_ns
+
+# Log records and probe samples are handed to a queue on the probe's thread and
+# formatted and written on a background thread, several at a time, so the event
+# loop never waits on file I/O. Formatting happens on the writer thread too, so
+# on hot paths log with %-style arguments rather than f-strings. Dict, list and set
+# arguments are copied (one level deep) when the record is queued, so they log as
+# they were at the call even if the caller changes them afterwards.
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_BATCH_SIZE = 256
+_MUTABLE_ARGUMENT_TYPES = (dict, list, set)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # The stock handler formats the message here, on the caller's thread
+        if isinstance(record.args, dict):
+            record.args = dict(record.args)
+        elif record.args:
+            record.args = tuple(copy.copy(arg) if isinstance(arg, _MUTABLE_ARGUMENT_TYPES) else arg for arg in record.args)
+        return record
+
+
+class BatchedFileHandler(logging.FileHandler):
+    """FileHandler writing formatted records in one go: when `batch_size` have
+    piled up, or as soon as the queue feeding it has been drained."""
+
+    def __init__(self, filename, log_queue, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(filename)
+        self.log_queue = log_queue
+        self.batch_size = batch_size
+        self.batch = []
+
+    def emit(self, record):
+        try:
+            self.batch.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self.batch) >= self.batch_size or self.log_queue.empty():
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.batch and self.stream:
+                self.stream.write(''.join(self.batch))
+                self.batch = []
+            super().flush()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+def start_logging(filename, level=logging.INFO, batch_size=DEFAULT_BATCH_SIZE):
+    """Route root logging through a queue to a batched file writer thread, stopped at exit."""
+    log_queue = queue.SimpleQueue()
+    handler = BatchedFileHandler(filename, log_queue, batch_size)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    listener.start()
+    # Exit handlers run last-registered first: drain the queue, then write what is left
+    atexit.register(handler.close)
+    atexit.register(listener.stop)
+    return listener
+
+
+class NdjsonSampleWriter:
+    """Sample sink appending one JSON object per probe to `path`.
+
+    `record` matches the sample sink signature of perform_latency_checks_async and
+    only queues the result; serialising and writing happen on a background thread.
+    Failed probes are written as {"ok": false} with the time they were reported.
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        self.file = open(path, 'a')
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._write_samples, name="ndjson-samples", daemon=True)
+        self.thread.start()
+
+    def record(self, target_name, mode, result):
+        self.queue.put((target_name, mode, result, None if result else wall_clock_ns()))
+
+    def _write_samples(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for entry in batch:
+                if entry is None:
+                    continue
+                target_name, mode, result, failed_at_ns = entry
+                sample = {"target": target_name, "mode": mode, "ok": bool(result), **(result or {"timestamp_ns": failed_at_ns})}
+                lines.append(json.dumps(sample, separators=(',', ':')) + '\n')
+            if lines:
+                self.file.write(''.join(lines))
+                self.file.flush()
+            if None in batch:
+                return
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
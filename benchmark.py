@@ -0,0 +1,250 @@
+import aiohttp
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from prettytable import PrettyTable
+from termcolor import colored
+from latency_bot import create_probe_session, format_ms, measure_latency, measure_raw_latency, warm_up_session
+from load_generator import run_open_loop
+from raw_http import RawHttpClient
+from targets import load_targets
+from timing import ClockOffsetEstimator
+from ws_probe import WebSocketProbe
+
+# Benchmarks the probe paths against mock_exchange.py, run as a separate process
+# so its CPU time does not count as ours:
+#   accuracy  sequential probes against a fixed injected delay and clock skew:
+#             RTT bias and jitter (measured RTT minus the mock's own handling time),
+#             clock offset bias and CPU per probe
+#   rate      open-loop steps of increasing rate; the highest step that is sent on
+#             schedule, without drops or failures, is the max sustainable rate
+#   faults    injected errors and stalls must show up as failures and tail samples
+# Results can be saved as a baseline; later runs are compared against it.
+PATHS = ["aiohttp", "raw", "websocket"]
+ACCURACY_LATENCY = "constant:2"
+ACCURACY_SKEW_MS = 5.0
+RATE_STEPS = [100, 200, 500, 1000, 2000, 5000, 10000]
+RATE_MAX_IN_FLIGHT = 64
+# Looser than the load test default: the mock shares the machine, and its own
+# scheduling adds to ours. A rate step is sustained when at most MAX_LATE_SHARE of
+# probes is sent later than this and at least MIN_ACHIEVED_SHARE of the rate goes out.
+DEFAULT_RATE_LATE_THRESHOLD_MS = 5
+MAX_LATE_SHARE = 0.01
+MIN_ACHIEVED_SHARE = 0.95
+FAULT_ERROR_RATE = 0.05
+FAULT_STALL_RATE = 0.02
+FAULT_STALL_MS = 50.0
+# Dropped pongs never arrive; waiting a few stalls long for them keeps the fault run short
+FAULT_PING_TIMEOUT_SECONDS = 4 * FAULT_STALL_MS / 1e3
+ACCURACY_PING_TIMEOUT_SECONDS = 5
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+# metric -> (lower is better, relative tolerance, absolute tolerance); both must be exceeded to flag
+REGRESSION_TOLERANCES = {
+    "rtt_bias_ns": (True, 0.25, 50_000),
+    "jitter_ns": (True, 0.25, 50_000),
+    "abs_offset_bias_ns": (True, 0.5, 100_000),
+    "cpu_per_probe_us": (True, 0.25, 20),
+    "max_rate_per_second": (False, 0.2, 0),
+}
+
+
+@contextlib.asynccontextmanager
+async def run_mock(port, *mock_arguments):
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_exchange.py'),
+        '--port', str(port), *mock_arguments, stdout=asyncio.subprocess.PIPE)
+    try:
+        # The mock prints one line once it is listening
+        await asyncio.wait_for(process.stdout.readline(), 10)
+        yield f"127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        await process.wait()
+
+
+@contextlib.asynccontextmanager
+async def open_path(path, address, estimator, pool_size=1, ping_timeout_seconds=ACCURACY_PING_TIMEOUT_SECONDS):
+    # Yields a zero-argument coroutine function running one probe on that path
+    url = f"http://{address}/v5/market/time"
+    target = load_targets({"targets": [{"name": "benchmark", "url": url}], "number_of_checks": 1})[0]
+    if path == "aiohttp":
+        async with create_probe_session('warm', pool_size) as session:
+            await warm_up_session(session, target, pool_size)
+            yield lambda: measure_latency(session, url, estimator)
+    elif path == "raw":
+        client = RawHttpClient(url, pool_size)
+        await client.connect()
+        try:
+            yield lambda: measure_raw_latency(client, target, estimator)
+        finally:
+            client.close()
+    else:
+        probe = WebSocketProbe(f"ws://{address}/v5/public/linear")
+        await probe.connect()
+        try:
+            yield lambda: probe.ping(ping_timeout_seconds)
+        finally:
+            await probe.close()
+
+
+async def fetch_handling_stats(address, reset=False):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://{address}/mock/stats", params={"reset": "1"} if reset else None) as response:
+            return await response.json()
+
+
+async def benchmark_accuracy(path, address, probes):
+    estimator = ClockOffsetEstimator()
+    async with open_path(path, address, estimator) as probe:
+        for _ in range(min(probes, 50)):
+            await probe()
+        await fetch_handling_stats(address, reset=True)
+        round_trips_ns = []
+        cpu_start_seconds = time.process_time()
+        for _ in range(probes):
+            result = await probe()
+            if result:
+                round_trips_ns.append(result['round_trip_time_ns'])
+        cpu_seconds = time.process_time() - cpu_start_seconds
+    handling = await fetch_handling_stats(address)
+    estimate = estimator.estimate()
+    client_variance = statistics.variance(round_trips_ns) if len(round_trips_ns) > 1 else 0.0
+    quantiles = statistics.quantiles(round_trips_ns, n=100) if len(round_trips_ns) > 1 else [0.0] * 99
+    return {
+        "probes": len(round_trips_ns),
+        "rtt_p50_ns": quantiles[49],
+        "rtt_p99_ns": quantiles[98],
+        # What the client adds on top of what the server spent on the request
+        "rtt_bias_ns": statistics.mean(round_trips_ns) - handling["mean_ns"] if round_trips_ns else None,
+        "jitter_ns": max(client_variance - handling["stdev_ns"] ** 2, 0.0) ** 0.5,
+        "abs_offset_bias_ns": None if estimate is None else abs(estimate[0] - ACCURACY_SKEW_MS * 1e6),
+        "offset_error_ns": None if estimate is None else estimate[1],
+        "cpu_per_probe_us": cpu_seconds / max(probes, 1) * 1e6,
+    }
+
+
+async def benchmark_rate(path, address, rates, duration_seconds, late_threshold_ms):
+    max_rate = 0
+    cpu_per_probe_us = None
+    async with open_path(path, address, ClockOffsetEstimator(), RATE_MAX_IN_FLIGHT) as probe:
+        for rate in rates:
+            failures = []
+            cpu_start_seconds = time.process_time()
+            report = await run_open_loop(probe, rate, duration_seconds, RATE_MAX_IN_FLIGHT, late_threshold_ms * 1e6,
+                                         lambda result: failures.append(1) if not result else None)
+            cpu_seconds = time.process_time() - cpu_start_seconds
+            sustained = (not report.dropped and not failures and report.late <= MAX_LATE_SHARE * report.scheduled
+                         and report.achieved_rate_per_second >= MIN_ACHIEVED_SHARE * rate)
+            if not sustained:
+                break
+            max_rate = rate
+            cpu_per_probe_us = cpu_seconds / max(report.sent, 1) * 1e6
+    return {"max_rate_per_second": max_rate, "cpu_per_probe_at_max_rate_us": cpu_per_probe_us}
+
+
+async def benchmark_faults(path, address, probes):
+    failures = stalls = 0
+    # Every injected error would otherwise be logged
+    logging.disable(logging.ERROR)
+    try:
+        async with open_path(path, address, ClockOffsetEstimator(), ping_timeout_seconds=FAULT_PING_TIMEOUT_SECONDS) as probe:
+            for _ in range(probes):
+                result = await probe()
+                if not result:
+                    failures += 1
+                elif result['round_trip_time_ns'] >= FAULT_STALL_MS * 1e6:
+                    stalls += 1
+    finally:
+        logging.disable(logging.NOTSET)
+    return {"failure_share": failures / probes, "stall_share": stalls / probes}
+
+
+async def run_benchmarks(paths, probes, rates, rate_duration_seconds, late_threshold_ms, port):
+    results = {path: {} for path in paths}
+    async with run_mock(port, '--latency', ACCURACY_LATENCY, '--skew-ms', str(ACCURACY_SKEW_MS)) as address:
+        for path in paths:
+            results[path].update(await benchmark_accuracy(path, address, probes))
+    async with run_mock(port) as address:
+        for path in paths:
+            results[path].update(await benchmark_rate(path, address, rates, rate_duration_seconds, late_threshold_ms))
+    async with run_mock(port, '--error-rate', str(FAULT_ERROR_RATE), '--stall-rate', str(FAULT_STALL_RATE),
+                        '--stall-ms', str(FAULT_STALL_MS)) as address:
+        for path in paths:
+            results[path].update(await benchmark_faults(path, address, probes))
+    return results
+
+
+def find_regressions(results, baseline):
+    regressions = []
+    for path, metrics in results.items():
+        for metric, (lower_is_better, relative, absolute) in REGRESSION_TOLERANCES.items():
+            current, previous = metrics.get(metric), baseline.get(path, {}).get(metric)
+            if current is None or previous is None:
+                continue
+            change = current - previous if lower_is_better else previous - current
+            if change > absolute and change > relative * abs(previous):
+                regressions.append((path, metric, previous, current))
+    return regressions
+
+
+def print_results(results, regressions):
+    flagged = {(path, metric) for path, metric, _, _ in regressions}
+
+    def cell(path, metric, text):
+        return text + (" !" if (path, metric) in flagged else "")
+
+    table = PrettyTable()
+    table.field_names = ["Path", "RTT p50 (ms)", "RTT Bias (ms)", "Jitter (ms)", "Offset Bias (ms)", "CPU per Probe (us)",
+                         "Max Rate (req/s)", f"Failures ({FAULT_ERROR_RATE:.0%} injected)", f"Stalls ({FAULT_STALL_RATE:.0%} injected)"]
+    for path, metrics in results.items():
+        table.add_row([path, format_ms(metrics["rtt_p50_ns"]), cell(path, "rtt_bias_ns", format_ms(metrics["rtt_bias_ns"])),
+                       cell(path, "jitter_ns", format_ms(metrics["jitter_ns"])),
+                       cell(path, "abs_offset_bias_ns", format_ms(metrics["abs_offset_bias_ns"])),
+                       cell(path, "cpu_per_probe_us", f"{metrics['cpu_per_probe_us']:.0f}"),
+                       cell(path, "max_rate_per_second", str(metrics["max_rate_per_second"])),
+                       f"{metrics['failure_share']:.1%}", f"{metrics['stall_share']:.1%}"])
+    print(colored(table, "yellow"))
+    for path, metric, previous, current in regressions:
+        print(colored(f"Regression on {path}: {metric} went from {previous:.0f} to {current:.0f}", "red"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark probe overhead and accuracy against a local mock exchange")
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS)
+    parser.add_argument('--probes', type=int, default=2000, help="probes per path for the accuracy and fault runs")
+    parser.add_argument('--rate-duration', type=float, default=3.0, help="seconds per open-loop rate step")
+    parser.add_argument('--max-rate', type=int, default=RATE_STEPS[-1], help="highest rate step to try")
+    parser.add_argument('--late-threshold-ms', type=float, default=DEFAULT_RATE_LATE_THRESHOLD_MS,
+                        help="send lag above which a probe counts as late in the rate runs")
+    parser.add_argument('--port', type=int, default=18090, help="port for the mock exchange")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help="baseline file to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    rates = [rate for rate in RATE_STEPS if rate <= args.max_rate]
+    results = asyncio.run(run_benchmarks(args.paths, args.probes, rates, args.rate_duration, args.late_threshold_ms, args.port))
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["paths"]
+    regressions = find_regressions(results, baseline)
+    print_results(results, regressions)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({"created": datetime.now(timezone.utc).isoformat(), "host": platform.node(), "python": platform.python_version(),
+                       "paths": results}, f, indent=2)
+        print(colored(f"Baseline saved to {args.baseline}", "green"))
+    sys.exit(1 if regressions and not args.save_baseline else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import math
+import os
+from collections import deque
+from edges import edge_address_changed
+from timing import wall_clock_ns
+
+# Online regression detection over the probe stream, one detector per target and
+# mode, constant time and memory per sample. Round trips are tracked on a log
+# scale, where latency is close to normal:
+#   median  one-sided CUSUM of the standardised log round trip against an EWMA
+#           baseline; fires on a sustained upward shift of the typical latency
+#   tail    Bernoulli CUSUM on how often a sample (or a failed probe) lands above
+#           a streaming estimate of the baseline tail quantile; fires when that
+#           rate moves from 1 - tail_quantile towards tail_shift_rate
+# The baseline stops learning while either statistic is past half its threshold,
+# so it does not follow an incident up. After a detection the detector re-learns its baseline.
+DEFAULT_CHANGE_DETECTION = {
+    "warmup_samples": 200,
+    "smoothing": 0.01,
+    "median_slack": 0.75,
+    "median_threshold": 10.0,
+    "tail_quantile": 0.99,
+    "tail_shift_rate": 0.05,
+    "tail_threshold": 9.0,
+    # Samples kept before and after a detection for its snapshot
+    "snapshot_samples": 200,
+    "post_samples": 50,
+    # Minimum time between two alerts for the same target and mode
+    "cooldown_seconds": 300,
+    "incident_dir": "incidents",
+    "alert_command": None,
+    "alert_timeout_seconds": 10,
+}
+# Keeps a run of identical latencies (e.g. a local mock) from standardising to infinity
+MIN_LOG_STDEV = 0.02
+# A lone outlier adds at most this much to the median statistic; outliers are the tail detector's job
+MAX_MEDIAN_Z = 3.0
+# z-score of the tail quantile a fresh baseline starts from, for 0.99 on a normal scale
+_INITIAL_TAIL_Z = 2.326
+
+
+class LatencyChangeDetector:
+    def __init__(self, settings):
+        self.settings = settings
+        self.tail_exceed_step = math.log(settings['tail_shift_rate'] / (1 - settings['tail_quantile']))
+        self.tail_within_step = math.log((1 - settings['tail_shift_rate']) / settings['tail_quantile'])
+        self.relearn()
+
+    def relearn(self):
+        self.learned = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.stdev = None
+        self.tail = None
+        self.median_statistic = 0.0
+        self.tail_statistic = 0.0
+
+    @property
+    def ready(self):
+        return self.stdev is not None
+
+    def baseline(self):
+        return {"median_ns": math.exp(self.mean), "tail_ns": math.exp(self.tail), "log_stdev": self.stdev} if self.ready else None
+
+    def _learn(self, log_value):
+        self.learned += 1
+        delta = log_value - self.mean
+        self.mean += delta / self.learned
+        self.m2 += delta * (log_value - self.mean)
+        if self.learned >= self.settings['warmup_samples']:
+            self.stdev = max(math.sqrt(self.m2 / (self.learned - 1)), MIN_LOG_STDEV)
+            self.tail = self.mean + _INITIAL_TAIL_Z * self.stdev
+
+    def _adapt(self, log_value):
+        alpha = self.settings['smoothing']
+        delta = log_value - self.mean
+        self.mean += alpha * delta
+        self.stdev = max(math.sqrt((1 - alpha) * (self.stdev ** 2 + alpha * delta * delta)), MIN_LOG_STDEV)
+        # Stochastic-approximation quantile: settles where the exceedance rate is 1 - tail_quantile
+        self.tail += alpha * 10 * self.stdev * ((log_value > self.tail) - (1 - self.settings['tail_quantile']))
+
+    def update(self, round_trip_ns):
+        """Feed one probe (None for a failed one); returns "median" or "tail" on a detection."""
+        log_value = math.log(max(round_trip_ns, 1)) if round_trip_ns is not None else None
+        if not self.ready:
+            if log_value is not None:
+                self._learn(log_value)
+            return None
+        exceeded = log_value is None or log_value > self.tail
+        self.tail_statistic = max(0.0, self.tail_statistic + (self.tail_exceed_step if exceeded else self.tail_within_step))
+        if log_value is not None:
+            z = min((log_value - self.mean) / self.stdev, MAX_MEDIAN_Z)
+            self.median_statistic = max(0.0, self.median_statistic + z - self.settings['median_slack'])
+        if self.median_statistic > self.settings['median_threshold']:
+            return "median"
+        if self.tail_statistic > self.settings['tail_threshold']:
+            return "tail"
+        if (log_value is not None and self.median_statistic < self.settings['median_threshold'] / 2
+                and self.tail_statistic < self.settings['tail_threshold'] / 2):
+            self._adapt(log_value)
+        return None
+
+
+class ChangePointMonitor:
+    """Sample sink running a LatencyChangeDetector per target and mode.
+
+    On a detection, `on_regression(event)` is called right away (the watchdog starts
+    network diagnostics from it) and `alert_command`, if set, is run with the event
+    as JSON on stdin. The snapshot of samples around the detection is written to
+    `incident_dir` once `post_samples` more samples have arrived.
+    """
+
+    def __init__(self, settings=None, on_regression=None):
+        self.settings = {**DEFAULT_CHANGE_DETECTION, **(settings or {})}
+        self.on_regression = on_regression
+        self.detectors = {}
+        self.recent = {}
+        self.last_alert_ns = {}
+        self.edge_addresses = {}
+        self.open_incidents = []
+        self.regressions = []
+        self.tasks = set()
+
+    def record(self, target_name, mode, result):
+        round_trip_ns = result.get('round_trip_time_ns') if result else None
+        if result and round_trip_ns is None:
+            # Successful samples without a round trip, e.g. WebSocket stream deliveries
+            return
+        key = (target_name, mode)
+        address_changed = edge_address_changed(self.edge_addresses, key, result)
+        detector = self.detectors.get(key)
+        if detector is None:
+            detector = self.detectors[key] = LatencyChangeDetector(self.settings)
+            self.recent[key] = deque(maxlen=self.settings['snapshot_samples'])
+        elif address_changed:
+            # Another edge address behind the same slot is a new baseline, not a regression
+            detector.relearn()
+            self.recent[key].clear()
+        sample = [result['timestamp_ns'] if result and 'timestamp_ns' in result else wall_clock_ns(), round_trip_ns]
+        self.recent[key].append(sample)
+        for event in list(self.open_incidents):
+            if (event['target'], event['mode']) == key:
+                event['samples_after'].append(sample)
+                if len(event['samples_after']) >= self.settings['post_samples']:
+                    self.open_incidents.remove(event)
+                    self._write_snapshot(event)
+
+        kind = detector.update(round_trip_ns)
+        if kind is not None:
+            baseline = detector.baseline()
+            detector.relearn()
+            self._detected(key, kind, baseline, sample[0])
+
+    def _detected(self, key, kind, baseline, timestamp_ns):
+        cooldown_ns = self.settings['cooldown_seconds'] * 1e9
+        if timestamp_ns - self.last_alert_ns.get(key, -cooldown_ns) < cooldown_ns:
+            logging.info(f"Latency regression ({kind}) on {key[0]}/{key[1]} within the alert cooldown")
+            return
+        self.last_alert_ns[key] = timestamp_ns
+        event = {"target": key[0], "mode": key[1], "kind": kind, "detected_at_ns": timestamp_ns, "baseline": baseline,
+                 "samples_before": list(self.recent[key]), "samples_after": []}
+        logging.warning(f"Latency regression ({kind}) on {key[0]}/{key[1]}: baseline median "
+                        f"{baseline['median_ns'] / 1e6:.3f} ms, tail {baseline['tail_ns'] / 1e6:.3f} ms")
+        self.regressions.append(key)
+        self.open_incidents.append(event)
+        if self.on_regression is not None:
+            self.on_regression(event)
+        if self.settings['alert_command']:
+            # Serialised now: samples_after keeps growing while the command starts
+            task = asyncio.get_running_loop().create_task(self._run_alert_command(json.dumps(event)))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def take_regressions(self):
+        # (target, mode) pairs detected since the last call
+        regressions, self.regressions = self.regressions, []
+        return regressions
+
+    def _write_snapshot(self, event):
+        if not self.settings['incident_dir']:
+            return
+        os.makedirs(self.settings['incident_dir'], exist_ok=True)
+        path = os.path.join(self.settings['incident_dir'], f"{event['detected_at_ns']}-{event['target']}-{event['mode']}.json")
+        with open(path, 'w') as f:
+            json.dump(event, f)
+        logging.info(f"Regression snapshot written to {path}")
+
+    async def _run_alert_command(self, payload):
+        command = self.settings['alert_command']
+        try:
+            process = await asyncio.create_subprocess_exec(*command, stdin=asyncio.subprocess.PIPE)
+        except OSError as e:
+            logging.error(f"Could not start alert command {command[0]}: {e}")
+            return
+        try:
+            await asyncio.wait_for(process.communicate(payload.encode()), self.settings['alert_timeout_seconds'])
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            logging.error(f"Alert command {command[0]} timed out after {self.settings['alert_timeout_seconds']}s")
+
+    def flush(self):
+        # Snapshots still waiting for samples are written as they are, e.g. on shutdown
+        for event in self.open_incidents:
+            self._write_snapshot(event)
+        self.open_incidents = []
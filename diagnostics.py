@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import signal
+from urllib.parse import urlparse
+from timing import monotonic_ns
+
+# "{host}" is substituted per run. Point these at stand-in scripts through the
+# `diagnostic_commands` config key to exercise diagnostics without the real tools.
+# mtr reports as JSON with AS lookups and no reverse DNS, so hops parse into
+# IP/ASN records (see hops.py); text reports are still understood.
+DIAGNOSTIC_COMMANDS = {
+    "ping": ["ping", "-c", "4", "{host}"],
+    "traceroute": ["traceroute", "{host}"],
+    "mtr": ["mtr", "--json", "--aslookup", "--no-dns", "--report-cycles", "5", "{host}"],
+}
+DEFAULT_DIAGNOSTICS_TIMEOUT_SECONDS = 60
+
+
+def diagnostics_host(target):
+    # Accepts a full URL or a bare host name
+    return urlparse(target).hostname or target
+
+
+async def run_diagnostic_command(tool, command, timeout_seconds):
+    result = {"tool": tool, "command": command, "returncode": None, "stdout": "", "stderr": "", "error": None}
+    start_ns = monotonic_ns()
+    try:
+        # Own process group, so a kill also reaches helpers such as mtr-packet, which
+        # would otherwise keep the pipes open and the wait below hanging
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                       start_new_session=True)
+    except OSError as e:
+        result["error"] = f"could not start {command[0]}: {e}"
+        result["elapsed_ns"] = monotonic_ns() - start_ns
+        return result
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout_seconds)
+    except asyncio.TimeoutError:
+        _kill(process)
+        await process.wait()
+        result["error"] = f"timed out after {timeout_seconds}s"
+    except asyncio.CancelledError:
+        # Never leave a traceroute running behind a cancelled watchdog
+        _kill(process)
+        await process.wait()
+        raise
+    else:
+        result["stdout"] = stdout.decode(errors='replace')
+        result["stderr"] = stderr.decode(errors='replace')
+        if process.returncode != 0:
+            result["error"] = f"exited with status {process.returncode}"
+    result["returncode"] = process.returncode
+    result["elapsed_ns"] = monotonic_ns() - start_ns
+    return result
+
+
+def _kill(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def run_network_diagnostics_async(target, commands=None, timeout_seconds=DEFAULT_DIAGNOSTICS_TIMEOUT_SECONDS):
+    host = diagnostics_host(target)
+    commands = commands or DIAGNOSTIC_COMMANDS
+    logging.info(f"Running network diagnostics for {host}")
+    results = await asyncio.gather(*[
+        run_diagnostic_command(tool, [argument.format(host=host) for argument in command], timeout_seconds)
+        for tool, command in commands.items()
+    ])
+    for result in results:
+        if result["error"] is None:
+            logging.info(f"{result['tool'].upper()} Result: {result['stdout']}")
+        else:
+            logging.error(f"Error running {result['tool']}: {result['error']}\n{result['stderr']}")
+    return results
+
+
+class BackgroundDiagnostics:
+    """Runs at most one diagnostics round at a time next to the probe loop."""
+
+    def __init__(self):
+        self.task = None
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self, coroutine):
+        if self.running:
+            # The previous round is still going (e.g. traceroute through a lossy path)
+            coroutine.close()
+            logging.info("Previous network diagnostics still running; skipping this round")
+            return False
+        self.task = asyncio.create_task(coroutine)
+        self.task.add_done_callback(self._log_failure)
+        return True
+
+    async def cancel(self):
+        if self.running:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    @staticmethod
+    def _log_failure(task):
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Network diagnostics failed: {task.exception()}")
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+import socket
+from aiohttp.abc import AbstractResolver
+from prettytable import PrettyTable
+from termcolor import colored
+from histogram import PERCENTILES
+from timing import monotonic_ns
+
+# The "edges" probe mode resolves every A/AAAA address of a target's host and
+# probes each one through its own warm pool. A cycle's statistics are reported as
+# mode "edge <address>" for the ranking. Sample sinks keep state per mode for the
+# whole run, and CDN address rotation would grow their labels without bound, so
+# they see mode "edge #<slot>" instead, with the address in the sample's
+# `edge_address`. An address keeps its slot while it stays in the host's answers;
+# sinks that learn from a series reset it when a slot moves to another address
+# (see edge_address_changed).
+# Requests still go to the host name, so TLS SNI, certificate checks and the Host
+# header are those of the host; only the address is pinned.
+EDGE_MODE_PREFIX = "edge "
+EDGE_SLOT_PREFIX = "edge #"
+
+
+def edge_mode(address):
+    return f"{EDGE_MODE_PREFIX}{address}"
+
+
+def edge_slot_mode(slot):
+    return f"{EDGE_SLOT_PREFIX}{slot}"
+
+
+def edge_address_changed(addresses_by_key, key, result):
+    # True when the sample for `key` comes from another edge address than the one before it
+    address = result.get('edge_address') if result else None
+    if address is None:
+        return False
+    previous = addresses_by_key.get(key)
+    addresses_by_key[key] = address
+    return previous is not None and previous != address
+
+
+def edge_sample_sink(sample_sink, slot, address):
+    if sample_sink is None:
+        return None
+
+    def record(target_name, mode, result):
+        sample_sink(target_name, edge_slot_mode(slot), {**result, "edge_address": address} if result else result)
+    return record
+
+
+class PinnedResolver(AbstractResolver):
+    """aiohttp resolver answering every lookup with one fixed address."""
+
+    def __init__(self, address):
+        self.address = address
+        self.family = socket.AF_INET6 if ipaddress.ip_address(address).version == 6 else socket.AF_INET
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        return [{"hostname": host, "host": self.address, "port": port, "family": self.family,
+                 "proto": 0, "flags": socket.AI_NUMERICHOST}]
+
+    async def close(self):
+        pass
+
+
+class AddressCache:
+    """Every A/AAAA address of a host, resolved up front and kept for `ttl_seconds`.
+
+    getaddrinfo does not expose record TTLs, so the TTL is configured. `static_hosts`
+    ({host: [addresses]}) answers for the listed hosts instead of DNS, e.g. for a
+    local stand-in of a multi-edge host.
+    """
+
+    def __init__(self, ttl_seconds=300, ipv6=True, static_hosts=None):
+        self.ttl_ns = int(ttl_seconds * 1e9)
+        self.ipv6 = ipv6
+        self.static_hosts = static_hosts or {}
+        self.entries = {}
+        self.slots = {}
+
+    def slot(self, host, address):
+        # 1-based slot of an address among the last answers for the host
+        return self.slots[host].index(address) + 1
+
+    def _assign_slots(self, host, addresses):
+        # Addresses still answered keep their slot; new ones take the freed slots first
+        slots = [address if address in addresses else None for address in self.slots.get(host, [])]
+        for address in addresses:
+            if address not in slots:
+                if None in slots:
+                    slots[slots.index(None)] = address
+                else:
+                    slots.append(address)
+        self.slots[host] = slots
+
+    async def resolve(self, host, port):
+        if host in self.static_hosts:
+            addresses = list(self.static_hosts[host])
+            self._assign_slots(host, addresses)
+            return addresses
+        now_ns = monotonic_ns()
+        entry = self.entries.get(host)
+        if entry is not None and entry[0] > now_ns:
+            return entry[1]
+        families = (socket.AF_INET, socket.AF_INET6) if self.ipv6 else (socket.AF_INET,)
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos if info[0] in families))
+        logging.info(f"Resolved {host} to {len(addresses)} addresses in {(monotonic_ns() - now_ns) / 1e6:.2f} ms: {', '.join(addresses)}")
+        self.entries[host] = (now_ns + self.ttl_ns, addresses)
+        self._assign_slots(host, addresses)
+        return addresses
+
+
+def rank_edges(stats_by_mode):
+    # [(address, stats)], fastest median round trip first; edges without a single answer go last
+    edges = [(mode[len(EDGE_MODE_PREFIX):], stats) for mode, stats in stats_by_mode.items() if mode.startswith(EDGE_MODE_PREFIX)]
+    return sorted(edges, key=lambda edge: (not edge[1].count, edge[1].histograms['round_trip_time_ns'].percentile(50) if edge[1].count else 0))
+
+
+def print_edge_ranking(target_name, stats_by_mode):
+    ranking = rank_edges(stats_by_mode)
+    if not ranking:
+        return
+    table = PrettyTable()
+    table.field_names = ["Rank", "Address", "Probes", "Failed", "p50 (ms)", "p99 (ms)", "p50 vs Best (ms)"]
+    best_p50_ns = None
+    for rank, (address, stats) in enumerate(ranking, 1):
+        p50_ns, p99_ns = stats.histograms['round_trip_time_ns'].percentiles([50, 99]) if stats.count else (None, None)
+        if best_p50_ns is None:
+            best_p50_ns = p50_ns
+        delta = "-" if p50_ns is None or best_p50_ns is None else f"+{(p50_ns - best_p50_ns) / 1e6:.2f}"
+        table.add_row([rank, address, stats.count, stats.failures, "-" if p50_ns is None else f"{p50_ns / 1e6:.2f}",
+                       "-" if p99_ns is None else f"{p99_ns / 1e6:.2f}", delta])
+    print(colored(f"{target_name} · edges by median round trip", "blue"))
+    print(colored(table, "green"))
+
+
+def pinned_addresses(stats_by_target, hosts_by_target):
+    # {target: recommendation} for every target probed in edges mode
+    pins = {}
+    for target, stats_by_mode in stats_by_target.items():
+        ranking = [(address, stats) for address, stats in rank_edges(stats_by_mode) if stats.count]
+        if not ranking:
+            continue
+        pins[target] = {
+            "host": hosts_by_target[target],
+            "address": ranking[0][0],
+            "ranking": [{"address": address, "probes": stats.count, "failures": stats.failures,
+                         **{f"p{percentile:g}_ns": value for percentile, value in zip(PERCENTILES, stats.histograms['round_trip_time_ns'].percentiles())}}
+                        for address, stats in ranking],
+        }
+    return pins
+
+
+def main():
+    # Imported here: latency_bot imports this module for the edges probe mode
+    from latency_bot import load_config, perform_latency_checks_async
+    from targets import load_targets
+    from urllib.parse import urlparse
+
+    parser = argparse.ArgumentParser(description="Probe every edge address of each target and recommend the fastest")
+    parser.add_argument('--export', help="write the pinned-address recommendation to this JSON file")
+    parser.add_argument('--hosts', action='store_true', help="also print the recommendation as /etc/hosts lines")
+    args = parser.parse_args()
+
+    config = load_config()
+    # Edges only: pacing meant for open_loop would be rejected for these targets
+    entries = [{key: value for key, value in entry.items() if key != 'rate_per_second'} for entry in config.get('targets') or []]
+    config = {**config, "probe_modes": ["edges"], "targets": [{**entry, "probe_modes": ["edges"]} for entry in entries]}
+    hosts_by_target = {target['name']: urlparse(target['url']).hostname for target in load_targets(config)}
+    stats_by_target = asyncio.run(perform_latency_checks_async(config))
+    for target, stats_by_mode in stats_by_target.items():
+        print_edge_ranking(target, stats_by_mode)
+
+    pins = pinned_addresses(stats_by_target, hosts_by_target)
+    if args.export:
+        with open(args.export, 'w') as f:
+            json.dump(pins, f, indent=2)
+        print(colored(f"Pinned addresses written to {args.export}", "green"))
+    if args.hosts:
+        for pin in pins.values():
+            print(f"{pin['address']}\t{pin['host']}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(filename='latency_checks.log', level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    main()
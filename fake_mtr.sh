@@ -0,0 +1,12 @@
+#!/bin/sh
+# Stand-in for `mtr --json` (see `diagnostic_commands`): prints a fixed two-hop
+# report for the host. An optional second argument delays the report by that
+# many seconds, to exercise diagnostics timeouts and cancellation.
+# Usage: ./fake_mtr.sh <host> [delay_seconds]
+sleep "${2:-0}"
+cat <<REPORT
+{"report": {"mtr": {"dst": "$1", "tests": 5}, "hubs": [
+  {"count": 1, "host": "192.168.1.1", "ASN": "AS???", "Loss%": 0.0, "Snt": 5, "Last": 0.4, "Avg": 0.5, "Best": 0.3, "Wrst": 0.8, "StDev": 0.2},
+  {"count": 2, "host": "$1", "ASN": "AS64500", "Loss%": 0.0, "Snt": 5, "Last": 1.9, "Avg": 2.1, "Best": 1.8, "Wrst": 2.6, "StDev": 0.3}
+]}}
+REPORT
@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from prettytable import PrettyTable
+from termcolor import colored
+from histogram import LatencyStats
+from latency_bot import (METRICS, calculate_and_print_statistics, close_websocket_probes, configure_logging, load_config,
+                         perform_target_checks_async, print_open_loop_report, print_target_summary)
+from load_generator import OpenLoopReport
+from targets import load_targets
+from edges import print_edge_ranking
+from sources import print_source_comparison
+
+# Above this share of a core, a worker's own scheduling delays start to show up in the tail
+BUSY_WARNING_PERCENT = 80
+
+
+def _split(total, parts):
+    return [total // parts + (1 if index < total % parts else 0) for index in range(parts)]
+
+
+def shard_targets(targets, workers):
+    """Spread targets over `workers` lists of targets.
+
+    With fewer workers than targets, whole targets go round-robin. With more, each
+    target is split across several workers under the same name, its checks,
+    concurrency and rates divided between them, so the coordinator can merge the
+    shards back into one result per target.
+    """
+    shards = [[] for _ in range(workers)]
+    for index, target in enumerate(targets):
+        owners = [worker for worker in range(workers) if worker % len(targets) == index] or [index % workers]
+        fraction = 1 / len(owners)
+        for worker, checks in zip(owners, _split(target['number_of_checks'], len(owners))):
+            shards[worker].append({
+                **target,
+                "number_of_checks": checks,
+                "concurrency": max(1, math.ceil(target['concurrency'] * fraction)),
+                "max_connections": max(1, math.ceil(target['max_connections'] * fraction)),
+                "load_test": {**target['load_test'], "rate_per_second": target['load_test']['rate_per_second'] * fraction,
+                              "max_in_flight": max(1, math.ceil(target['load_test']['max_in_flight'] * fraction))},
+                "websocket": {**target['websocket'], "ping_rate_per_second": target['websocket']['ping_rate_per_second'] * fraction},
+            })
+    return shards
+
+
+async def probe_shard(targets):
+    reports = {}
+
+    def on_report(target, report):
+        reports[target['name']] = report.to_dict()
+
+    try:
+        results = await asyncio.gather(*[perform_target_checks_async(target, on_report=on_report) for target in targets])
+    finally:
+        await close_websocket_probes()
+    return {
+        "stats": {target['name']: {mode: stats.to_dict() for mode, stats in stats_by_mode.items()}
+                  for target, stats_by_mode in zip(targets, results)},
+        "reports": reports,
+        "probes": sum(stats.count + stats.failures for stats_by_mode in results for stats in stats_by_mode.values()),
+        "event_loop": type(asyncio.get_running_loop()).__module__.split('.')[0],
+    }
+
+
+def run_worker(worker_id, targets, use_uvloop):
+    # Runs in its own process: one core, one event loop, and only aggregates go back.
+    # Debug logging is left off here, since formatting log lines would cost probe time.
+    cpu = None
+    if hasattr(os, 'sched_setaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+        cpu = cpus[worker_id % len(cpus)]
+        os.sched_setaffinity(0, {cpu})
+    if use_uvloop:
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            pass
+    cpu_start_seconds, wall_start_seconds = time.process_time(), time.monotonic()
+    result = asyncio.run(probe_shard(targets))
+    result.update(worker=worker_id, cpu=cpu, targets=[target['name'] for target in targets],
+                  cpu_seconds=time.process_time() - cpu_start_seconds, wall_seconds=time.monotonic() - wall_start_seconds)
+    return result
+
+
+def run_fleet(config, workers=None, use_uvloop=True):
+    targets = load_targets(config)
+    workers = workers or os.cpu_count() or 1
+    shards = [shard for shard in shard_targets(targets, workers) if shard]
+    logging.info(f"Probing {len(targets)} targets with {len(shards)} worker processes")
+    # Workers are spawned, not forked, so no event loop or open socket leaks into them
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context('spawn')) as executor:
+        worker_results = list(executor.map(run_worker, range(len(shards)), shards, [use_uvloop] * len(shards)))
+
+    stats_by_target = {target['name']: {} for target in targets}
+    reports = {}
+    for worker_result in worker_results:
+        for target, stats_by_mode in worker_result["stats"].items():
+            for mode, stats in stats_by_mode.items():
+                stats_by_target[target].setdefault(mode, LatencyStats(METRICS)).merge(LatencyStats.from_dict(stats))
+        for target, report in worker_result["reports"].items():
+            report = OpenLoopReport.from_dict(report)
+            reports[target] = reports[target].merge(report) if target in reports else report
+    return stats_by_target, reports, worker_results
+
+
+def print_worker_table(worker_results):
+    table = PrettyTable()
+    table.field_names = ["Worker", "CPU", "Event Loop", "Targets", "Probes", "CPU Time (s)", "Busy (%)"]
+    for result in worker_results:
+        probes = result["probes"]
+        busy_percent = 100 * result["cpu_seconds"] / result["wall_seconds"] if result["wall_seconds"] else 0.0
+        busy = f"{busy_percent:.0f}" + (" !" if busy_percent > BUSY_WARNING_PERCENT else "")
+        table.add_row([result["worker"], "-" if result["cpu"] is None else result["cpu"], result["event_loop"],
+                       ", ".join(result["targets"]), probes, f"{result['cpu_seconds']:.2f}", busy])
+        logging.info(f"Worker {result['worker']} on CPU {result['cpu']} ({result['event_loop']}): {probes} probes, "
+                     f"{result['cpu_seconds']:.2f} s CPU over {result['wall_seconds']:.2f} s")
+    print(colored("Fleet workers", "blue"))
+    print(colored(table, "magenta"))
+    if any(result["wall_seconds"] and 100 * result["cpu_seconds"] / result["wall_seconds"] > BUSY_WARNING_PERCENT for result in worker_results):
+        print(colored(f"Workers marked ! were busy over {BUSY_WARNING_PERCENT}% of the time; lower the rates or add workers "
+                      "before trusting the tail.", "red"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe all targets from one worker process per core")
+    parser.add_argument('--workers', type=int, help="worker processes (default: `fleet.workers` or one per core)")
+    parser.add_argument('--no-uvloop', action='store_true', help="use the default asyncio event loop even if uvloop is installed")
+    args = parser.parse_args()
+
+    config = load_config()
+    late_thresholds_ms = {target['name']: target['load_test']['late_threshold_ms'] for target in load_targets(config)}
+    fleet = config.get('fleet', {})
+    stats_by_target, reports, worker_results = run_fleet(config, args.workers or fleet.get('workers'),
+                                                         not args.no_uvloop and fleet.get('use_uvloop', True))
+    for target, stats_by_mode in stats_by_target.items():
+        for mode, stats in stats_by_mode.items():
+            calculate_and_print_statistics(stats, mode, target)
+        if target in reports:
+            print_open_loop_report(target, reports[target], late_thresholds_ms[target])
+    print_target_summary(stats_by_target)
+    for target, stats_by_mode in stats_by_target.items():
+        print_edge_ranking(target, stats_by_mode)
+        print_source_comparison(target, stats_by_mode)
+    print_worker_table(worker_results)
+
+
+if __name__ == '__main__':
+    configure_logging()
+    main()
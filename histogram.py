@@ -0,0 +1,216 @@
+import math
+import numpy as np
+
+# HDR-style log-linear buckets over integer nanoseconds: values below 2**SUB_BUCKET_BITS
+# get exact buckets, above that every power of two is split into HALF_SUB_BUCKETS
+# buckets, i.e. a relative error below 1/HALF_SUB_BUCKETS (~0.8%). MAX_TRACKABLE_NS
+# (~73 minutes) bounds the array; larger values land in the top bucket and are still
+# reported exactly through `max`.
+SUB_BUCKET_BITS = 8
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKET_COUNT // 2
+MAX_TRACKABLE_NS = (1 << 42) - 1
+BUCKET_COUNT = SUB_BUCKET_COUNT + (MAX_TRACKABLE_NS.bit_length() - SUB_BUCKET_BITS) * HALF_SUB_BUCKETS
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+def bucket_index(magnitude_ns):
+    if magnitude_ns < SUB_BUCKET_COUNT:
+        return magnitude_ns
+    if magnitude_ns > MAX_TRACKABLE_NS:
+        magnitude_ns = MAX_TRACKABLE_NS
+    shift = magnitude_ns.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKET_COUNT + (shift - 1) * HALF_SUB_BUCKETS + (magnitude_ns >> shift) - HALF_SUB_BUCKETS
+
+
+def _bucket_midpoints():
+    midpoints = np.arange(BUCKET_COUNT, dtype=np.float64)
+    shifts = (np.arange(SUB_BUCKET_COUNT, BUCKET_COUNT) - SUB_BUCKET_COUNT) // HALF_SUB_BUCKETS + 1
+    sub_buckets = (np.arange(SUB_BUCKET_COUNT, BUCKET_COUNT) - SUB_BUCKET_COUNT) % HALF_SUB_BUCKETS + HALF_SUB_BUCKETS
+    lower = sub_buckets.astype(np.float64) * 2.0 ** shifts
+    midpoints[SUB_BUCKET_COUNT:] = lower + (2.0 ** shifts - 1) / 2
+    return midpoints
+
+
+BUCKET_MIDPOINTS_NS = _bucket_midpoints()
+
+
+class LatencyHistogram:
+    """Fixed-size, mergeable histogram of signed nanosecond values.
+
+    Offset-corrected one-way latencies can legitimately dip below zero, so
+    negative values get their own mirrored bucket array.
+    """
+
+    def __init__(self):
+        self.positive_counts = np.zeros(BUCKET_COUNT, dtype=np.int64)
+        self.negative_counts = np.zeros(BUCKET_COUNT, dtype=np.int64)
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+
+    def record(self, value_ns):
+        value_ns = int(value_ns)
+        if value_ns >= 0:
+            self.positive_counts[bucket_index(value_ns)] += 1
+        else:
+            self.negative_counts[bucket_index(-value_ns)] += 1
+        self.count += 1
+        self.total_ns += value_ns
+        if self.min_ns is None or value_ns < self.min_ns:
+            self.min_ns = value_ns
+        if self.max_ns is None or value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        self.positive_counts += other.positive_counts
+        self.negative_counts += other.negative_counts
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.min_ns = other.min_ns if self.min_ns is None else min(self.min_ns, other.min_ns)
+        self.max_ns = other.max_ns if self.max_ns is None else max(self.max_ns, other.max_ns)
+        return self
+
+    def mean(self):
+        return self.total_ns / self.count if self.count else None
+
+    def percentiles(self, percentiles=PERCENTILES):
+        if not self.count:
+            return [None] * len(percentiles)
+        # Walk the negative buckets from the largest magnitude down, then the positive ones
+        counts = np.concatenate((self.negative_counts[::-1], self.positive_counts))
+        values = np.concatenate((-BUCKET_MIDPOINTS_NS[::-1], BUCKET_MIDPOINTS_NS))
+        cumulative = np.cumsum(counts)
+        ranks = np.ceil(np.asarray(percentiles, dtype=np.float64) / 100 * self.count).clip(1, self.count)
+        estimates = values[np.searchsorted(cumulative, ranks)]
+        return [float(min(max(estimate, self.min_ns), self.max_ns)) for estimate in estimates]
+
+    def percentile(self, percentile):
+        return self.percentiles([percentile])[0]
+
+    def to_dict(self):
+        # Sparse form: only non-empty buckets, cheap to ship between processes
+        return {
+            "positive": {int(i): int(self.positive_counts[i]) for i in np.flatnonzero(self.positive_counts)},
+            "negative": {int(i): int(self.negative_counts[i]) for i in np.flatnonzero(self.negative_counts)},
+            "count": self.count,
+            "total_ns": self.total_ns,
+            "min_ns": self.min_ns,
+            "max_ns": self.max_ns,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for index, count in data["positive"].items():
+            histogram.positive_counts[int(index)] = count
+        for index, count in data["negative"].items():
+            histogram.negative_counts[int(index)] = count
+        histogram.count = data["count"]
+        histogram.total_ns = data["total_ns"]
+        histogram.min_ns = data["min_ns"]
+        histogram.max_ns = data["max_ns"]
+        return histogram
+
+
+def mann_whitney_u(first, second):
+    """Two-sided Mann-Whitney U test between two LatencyHistograms.
+
+    Works on the bucket counts, so values sharing a bucket count as ties; with
+    sub-1% buckets that costs little power. Returns (U of `first`, z, p-value)
+    from the tie-corrected normal approximation, or None if either is empty.
+    """
+    if not first.count or not second.count:
+        return None
+    first_counts = np.concatenate((first.negative_counts[::-1], first.positive_counts)).astype(np.float64)
+    second_counts = np.concatenate((second.negative_counts[::-1], second.positive_counts)).astype(np.float64)
+    # Pairs where `first` is larger, ties counting half
+    second_below = np.cumsum(second_counts) - second_counts
+    u = float(np.sum(first_counts * (second_below + second_counts / 2)))
+    n1, n2 = first.count, second.count
+    n = n1 + n2
+    ties = first_counts + second_counts
+    variance = n1 * n2 / 12 * ((n + 1) - float(np.sum(ties ** 3 - ties)) / (n * (n - 1))) if n > 1 else 0.0
+    if variance <= 0:
+        return u, 0.0, 1.0
+    z = (u - n1 * n2 / 2) / math.sqrt(variance)
+    return u, z, math.erfc(abs(z) / math.sqrt(2))
+
+
+class LatencyStats:
+    """Streaming aggregate of probe results: one histogram per metric plus counters."""
+
+    def __init__(self, metrics):
+        self.metrics = list(metrics)
+        self.histograms = {metric: LatencyHistogram() for metric in self.metrics}
+        self.failures = 0
+        self.reused_connections = 0
+        self.clock_offset_ns = None
+        self.offset_error_ns = None
+
+    @property
+    def count(self):
+        return self.histograms[self.metrics[0]].count
+
+    def record(self, result):
+        if not result:
+            self.failures += 1
+            return
+        for metric in self.metrics:
+            value = result.get(metric)
+            if value is not None:
+                self.histograms[metric].record(value)
+        if result.get('connection_reused'):
+            self.reused_connections += 1
+        if result.get('clock_offset_ns') is not None:
+            self.clock_offset_ns = result['clock_offset_ns']
+            self.offset_error_ns = max(self.offset_error_ns or 0, result['offset_error_ns'])
+
+    def record_all(self, results):
+        for result in results:
+            self.record(result)
+        return self
+
+    def merge(self, other):
+        for metric in other.metrics:
+            if metric not in self.histograms:
+                self.metrics.append(metric)
+                self.histograms[metric] = LatencyHistogram()
+            self.histograms[metric].merge(other.histograms[metric])
+        self.failures += other.failures
+        self.reused_connections += other.reused_connections
+        if other.clock_offset_ns is not None:
+            self.clock_offset_ns = other.clock_offset_ns
+            self.offset_error_ns = max(self.offset_error_ns or 0, other.offset_error_ns)
+        return self
+
+    def summary(self, metric):
+        # (count, mean, p50, p90, p99, p99.9, max) in ns, or None when the metric never occurred
+        histogram = self.histograms[metric]
+        if not histogram.count:
+            return None
+        return [histogram.count, histogram.mean()] + histogram.percentiles() + [histogram.max_ns]
+
+    def to_dict(self):
+        return {
+            "metrics": self.metrics,
+            "histograms": {metric: histogram.to_dict() for metric, histogram in self.histograms.items()},
+            "failures": self.failures,
+            "reused_connections": self.reused_connections,
+            "clock_offset_ns": self.clock_offset_ns,
+            "offset_error_ns": self.offset_error_ns,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data["metrics"])
+        stats.histograms = {metric: LatencyHistogram.from_dict(histogram) for metric, histogram in data["histograms"].items()}
+        stats.failures = data["failures"]
+        stats.reused_connections = data["reused_connections"]
+        stats.clock_offset_ns = data["clock_offset_ns"]
+        stats.offset_error_ns = data["offset_error_ns"]
+        return stats
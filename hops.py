@@ -0,0 +1,219 @@
+import json
+import logging
+import re
+import statistics
+from collections import deque, namedtuple
+from prettytable import PrettyTable
+
+# One network hop as seen by a diagnostic tool. Latencies are in ms, loss in
+# percent; `hop` is None for ping, which only sees the destination.
+HopRecord = namedtuple('HopRecord', ['hop', 'ip', 'host', 'asn', 'loss_pct', 'sent', 'best_ms', 'avg_ms', 'worst_ms', 'stdev_ms'])
+
+_IP_PATTERN = re.compile(r'^(\d{1,3}(\.\d{1,3}){3}|[0-9a-fA-F:]*:[0-9a-fA-F:.]+)$')
+_MTR_REPORT_LINE = re.compile(
+    r'^\s*(?P<hop>\d+)\.\s*\|--\s+(?:(?P<asn>AS\S+)\s+)?(?P<host>\S+)(?:\s+\((?P<ip>[^)]+)\))?\s+'
+    r'(?P<loss>[\d.]+)%?\s+(?P<sent>\d+)\s+[\d.]+\s+(?P<avg>[\d.]+)\s+(?P<best>[\d.]+)\s+(?P<worst>[\d.]+)\s+(?P<stdev>[\d.]+)')
+_TRACEROUTE_HOP_LINE = re.compile(r'^\s*(?P<hop>\d+)\s+(?P<rest>.*)$')
+_PING_DESTINATION = re.compile(r'^PING\s+(?P<host>\S+)\s+\((?P<ip>[^)]+)\)', re.MULTILINE)
+_PING_TRANSMITTED = re.compile(r'(?P<sent>\d+) packets transmitted, (?P<received>\d+) (?:packets )?received')
+_PING_LOSS = re.compile(r'(?P<loss>[\d.]+)% packet loss')
+# Linux: "rtt min/avg/max/mdev = ...", BSD/macOS: "round-trip min/avg/max/stddev = ..."
+_PING_RTT = re.compile(r'min/avg/max/(?:mdev|stddev) = (?P<best>[\d.]+)/(?P<avg>[\d.]+)/(?P<worst>[\d.]+)/(?P<stdev>[\d.]+) ms')
+
+
+def _unknown_host(host):
+    return host in (None, '', '???', '*')
+
+
+def _normalize_asn(asn):
+    # mtr prints "AS???" when the lookup found nothing
+    return None if asn in (None, '', 'AS???', '*') else asn
+
+
+def parse_mtr_json(output):
+    hubs = json.loads(output)['report']['hubs']
+    records = []
+    for hub in hubs:
+        host = hub.get('host')
+        unknown = _unknown_host(host)
+        records.append(HopRecord(
+            hop=int(hub['count']),
+            ip=None if unknown or not _IP_PATTERN.match(host) else host,
+            host=None if unknown else host,
+            asn=_normalize_asn(hub.get('ASN')),
+            loss_pct=float(hub['Loss%']),
+            sent=int(hub['Snt']),
+            best_ms=None if unknown else float(hub['Best']),
+            avg_ms=None if unknown else float(hub['Avg']),
+            worst_ms=None if unknown else float(hub['Wrst']),
+            stdev_ms=None if unknown else float(hub['StDev']),
+        ))
+    return records
+
+
+def parse_mtr_report(output):
+    records = []
+    for line in output.splitlines():
+        match = _MTR_REPORT_LINE.match(line)
+        if not match:
+            continue
+        host = match.group('host')
+        unknown = _unknown_host(host)
+        ip = match.group('ip') or (host if not unknown and _IP_PATTERN.match(host) else None)
+        records.append(HopRecord(
+            hop=int(match.group('hop')),
+            ip=ip,
+            host=None if unknown else host,
+            asn=_normalize_asn(match.group('asn')),
+            loss_pct=float(match.group('loss')),
+            sent=int(match.group('sent')),
+            best_ms=None if unknown else float(match.group('best')),
+            avg_ms=None if unknown else float(match.group('avg')),
+            worst_ms=None if unknown else float(match.group('worst')),
+            stdev_ms=None if unknown else float(match.group('stdev')),
+        ))
+    return records
+
+
+def _latency_record(hop, ip, host, asn, sent, rtts_ms):
+    loss_pct = 100.0 * (sent - len(rtts_ms)) / sent if sent else 0.0
+    if not rtts_ms:
+        return HopRecord(hop, ip, host, asn, loss_pct, sent, None, None, None, None)
+    return HopRecord(hop, ip, host, asn, loss_pct, sent, min(rtts_ms), statistics.mean(rtts_ms), max(rtts_ms),
+                     statistics.pstdev(rtts_ms))
+
+
+def parse_traceroute(output):
+    # Handles both "host (ip)" and numeric (-n) output, optional "[ASxxxx]" from -A,
+    # "*" for lost probes and "!H"-style annotations. When a hop answers from several
+    # addresses, the first one is reported.
+    records = []
+    for line in output.splitlines():
+        match = _TRACEROUTE_HOP_LINE.match(line)
+        if not match:
+            continue
+        ip = host = asn = None
+        sent = 0
+        rtts_ms = []
+        tokens = match.group('rest').split()
+        for index, token in enumerate(tokens):
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if token == '*':
+                sent += 1
+            elif following == 'ms' and re.match(r'^[\d.]+$', token):
+                sent += 1
+                rtts_ms.append(float(token))
+            elif token.startswith('(') and token.endswith(')'):
+                ip = ip or token[1:-1]
+            elif token.startswith('[') and token.endswith(']'):
+                asn = asn or _normalize_asn(token[1:-1].split('/')[0])
+            elif token == 'ms' or token.startswith('!'):
+                continue
+            elif host is None:
+                host = token
+                if _IP_PATTERN.match(token) and ip is None:
+                    ip = token
+        records.append(_latency_record(int(match.group('hop')), ip, host, asn, sent, rtts_ms))
+    return records
+
+
+def parse_ping(output):
+    destination = _PING_DESTINATION.search(output)
+    transmitted = _PING_TRANSMITTED.search(output)
+    loss = _PING_LOSS.search(output)
+    rtt = _PING_RTT.search(output)
+    if not transmitted:
+        return []
+    return [HopRecord(
+        hop=None,
+        ip=destination.group('ip') if destination else None,
+        host=destination.group('host') if destination else None,
+        asn=None,
+        loss_pct=float(loss.group('loss')) if loss else 0.0,
+        sent=int(transmitted.group('sent')),
+        best_ms=float(rtt.group('best')) if rtt else None,
+        avg_ms=float(rtt.group('avg')) if rtt else None,
+        worst_ms=float(rtt.group('worst')) if rtt else None,
+        stdev_ms=float(rtt.group('stdev')) if rtt else None,
+    )]
+
+
+def parse_diagnostic_output(tool, output):
+    if not output.strip():
+        return []
+    try:
+        if tool == 'mtr':
+            return parse_mtr_json(output) if output.lstrip().startswith('{') else parse_mtr_report(output)
+        if tool == 'traceroute':
+            return parse_traceroute(output)
+        if tool == 'ping':
+            return parse_ping(output)
+    except (ValueError, KeyError, TypeError) as e:
+        logging.error(f"Could not parse {tool} output: {e}")
+    return []
+
+
+class HopHistory:
+    """Bounded per-host, per-tool, per-hop time series of HopRecords."""
+
+    def __init__(self, max_samples_per_hop=1440):
+        self.max_samples_per_hop = max_samples_per_hop
+        self.series = {}
+
+    def add(self, host, tool, records, timestamp_ns):
+        for record in records:
+            key = (host, tool, record.hop)
+            if key not in self.series:
+                self.series[key] = deque(maxlen=self.max_samples_per_hop)
+            self.series[key].append((timestamp_ns, record))
+
+    def hops(self, host, tool):
+        return sorted((hop for (series_host, series_tool, hop) in self.series
+                       if series_host == host and series_tool == tool), key=lambda hop: -1 if hop is None else hop)
+
+    def latest(self, host, tool, hop):
+        samples = self.series.get((host, tool, hop))
+        return samples[-1] if samples else None
+
+    def baseline_avg_ms(self, host, tool, hop):
+        # Median of every earlier run, so one bad run does not move the reference
+        samples = self.series.get((host, tool, hop), ())
+        earlier = [record.avg_ms for _, record in list(samples)[:-1] if record.avg_ms is not None]
+        return statistics.median(earlier) if earlier else None
+
+    def changes(self, host, tool):
+        # (latest record, latest avg - baseline avg in ms or None) per hop of the most
+        # recent run, in hop order; hops that dropped off the path are left out
+        latest = {hop: self.latest(host, tool, hop) for hop in self.hops(host, tool)}
+        if not latest:
+            return []
+        latest_run_ns = max(timestamp_ns for timestamp_ns, _ in latest.values())
+        changes = []
+        for hop, (timestamp_ns, record) in latest.items():
+            if timestamp_ns != latest_run_ns:
+                continue
+            baseline_ms = self.baseline_avg_ms(host, tool, hop)
+            delta_ms = None if baseline_ms is None or record.avg_ms is None else record.avg_ms - baseline_ms
+            changes.append((record, delta_ms))
+        return changes
+
+
+def format_hop_value(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def build_hop_table(history, host, tool):
+    table = PrettyTable()
+    table.field_names = ["Hop", "IP", "ASN", "Loss%", "Sent", "Best (ms)", "Avg (ms)", "Worst (ms)", "StDev (ms)", "Δ Avg vs Baseline (ms)"]
+    changes = history.changes(host, tool)
+    # Flag the hop whose average moved the most since the baseline
+    deltas = [abs(delta_ms) for _, delta_ms in changes if delta_ms is not None]
+    largest_delta_ms = max(deltas) if deltas else None
+    for record, delta_ms in changes:
+        delta = "-" if delta_ms is None else f"{delta_ms:+.2f}"
+        if delta_ms is not None and largest_delta_ms and abs(delta_ms) == largest_delta_ms:
+            delta += " <"
+        table.add_row([record.hop if record.hop is not None else "-", record.ip or "???", record.asn or "-",
+                       f"{record.loss_pct:.1f}", record.sent, format_hop_value(record.best_ms), format_hop_value(record.avg_ms),
+                       format_hop_value(record.worst_ms), format_hop_value(record.stdev_ms), delta])
+    return table
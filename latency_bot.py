@@ -1,18 +1,68 @@
 import aiohttp
 import asyncio
-from datetime import datetime
 import json
-import numpy as np
 from prettytable import PrettyTable
 from termcolor import colored
 from urllib.parse import urlparse
 import subprocess
 import re
 import logging
+from timing import ClockOffsetEstimator, wall_clock_ns
+from tracing import PHASES, create_phase_trace_config, phase_durations
+from histogram import PERCENTILES, LatencyStats
+from load_generator import run_open_loop
+from targets import NO_SERVER_TIME, RESPONSE_PARSERS, load_targets, parse_bybit_time
+from sample_store import SampleStore
+from ws_probe import WebSocketProbe
+from raw_http import RawHttpClient, server_time_from_response
+from edges import AddressCache, PinnedResolver, edge_mode, edge_sample_sink, print_edge_ranking
+from sources import print_source_comparison, source_address, source_mode
+from async_logging import NdjsonSampleWriter, start_logging
 
-# Configure detailed logging at the beginning
-logging.basicConfig(filename='latency_checks_detailed.log', level=logging.DEBUG,
-                    format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+# Result key -> table label for everything the statistics aggregate
+METRICS = {
+    "round_trip_time_ns": "Round Trip Time",
+    "server_to_exchange_ns": "Server to Exchange",
+    "exchange_to_server_ns": "Exchange to Server",
+    **PHASES,
+    # Time inside the measured round trip spent in our own code and aiohttp's, not on the wire
+    "client_overhead_ns": "Client Overhead",
+    "intended_latency_ns": "RTT from Intended Send",
+    "delivery_delay_ns": "WS Delivery Delay",
+}
+ONE_WAY_METRICS = ("server_to_exchange_ns", "exchange_to_server_ns", "delivery_delay_ns")
+
+# One estimator per endpoint so the offset window survives across cycles
+clock_offset_estimators = {}
+# One WebSocket connection per target, kept open across cycles
+websocket_probes = {}
+# Resolved edge addresses per target, kept until their TTL runs out
+address_caches = {}
+
+def configure_logging():
+    # Detailed logging, written in batches from a background thread (see async_logging.py)
+    start_logging('latency_checks_detailed.log', logging.DEBUG)
+
+def get_clock_offset_estimator(url):
+    if url not in clock_offset_estimators:
+        clock_offset_estimators[url] = ClockOffsetEstimator()
+    return clock_offset_estimators[url]
+
+def get_websocket_probe(target):
+    if target['name'] not in websocket_probes:
+        websocket_probes[target['name']] = WebSocketProbe(target['ws_url'], target['websocket']['subscribe'])
+    return websocket_probes[target['name']]
+
+def get_address_cache(target):
+    if target['name'] not in address_caches:
+        edges = target['edges']
+        address_caches[target['name']] = AddressCache(edges['dns_ttl_seconds'], edges['ipv6'], edges['static_hosts'])
+    return address_caches[target['name']]
+
+async def close_websocket_probes():
+    for probe in websocket_probes.values():
+        await probe.close()
+    websocket_probes.clear()
 
 def print_watchdog_logo():
     logging.debug("Printing WatchDog logo")
@@ -44,87 +94,363 @@ def load_config():
         raise
     return config
 
-async def fetch_server_time(session, url):
-    logging.debug(f"Fetching server time from {url}")
+async def fetch_server_time(session, url, timings=None, parser=parse_bybit_time):
+    # Runs inside the timed region of measure_latency: nothing is logged on success
     try:
-        async with session.get(url) as response:
-            response_json = await response.json()
-            if 'result' in response_json and 'timeNano' in response_json['result']:
-                server_time_nano = float(response_json['result']['timeNano'])
-                logging.debug(f"Server time (nano) fetched: {server_time_nano}")
-                return server_time_nano
-            else:
-                logging.error("Key 'timeNano' not found in the response.")
-                return None
+        async with session.get(url, trace_request_ctx=timings) as response:
+            body = await response.read()
+            if timings is not None:
+                timings['body_end_ns'] = wall_clock_ns()
+            return parser(response.status, body)
     except Exception as e:
-        logging.error(f"Error fetching server time: {e}")
+        logging.error("Error fetching server time: %s", e)
         return None
 
-async def measure_latency(session, url):
-    logging.debug("Starting latency measurement")
+def client_overhead_ns(timings, local_start_time_ns, local_finish_time_ns):
+    # Round trip minus connection setup, waiting for the server and reading the body
+    if 'request_sent_ns' not in timings or 'body_end_ns' not in timings:
+        return None
+    setup_ns = sum(timings[end] - timings[start] for start, end in (('queued_start_ns', 'queued_end_ns'), ('connect_start_ns', 'connect_end_ns'))
+                   if start in timings and end in timings)
+    return timings['request_sent_ns'] - local_start_time_ns - setup_ns + local_finish_time_ns - timings['body_end_ns']
+
+async def measure_latency(session, url, estimator=None, parser=parse_bybit_time):
     try:
-        local_start_time_ns = datetime.utcnow().timestamp() * 1e9
-        server_time_ns = await fetch_server_time(session, url)
-        local_finish_time_ns = datetime.utcnow().timestamp() * 1e9
+        timings = {}
+        local_start_time_ns = wall_clock_ns()
+        server_time_ns = await fetch_server_time(session, url, timings, parser)
+        local_finish_time_ns = wall_clock_ns()
 
         if server_time_ns:
-            results = {
-                "round_trip_time_ns": local_finish_time_ns - local_start_time_ns,
-                "server_to_exchange_ns": server_time_ns - local_start_time_ns,
-                "exchange_to_server_ns": local_finish_time_ns - server_time_ns
-            }
-            logging.debug(f"Latency measurement results: {results}")
+            results = {"timestamp_ns": local_finish_time_ns, "round_trip_time_ns": local_finish_time_ns - local_start_time_ns,
+                       "client_overhead_ns": client_overhead_ns(timings, local_start_time_ns, local_finish_time_ns)}
+            if server_time_ns is not NO_SERVER_TIME:
+                if estimator is None:
+                    estimator = get_clock_offset_estimator(url)
+                # Bracket the exchange timestamp by the request leg only, so connection
+                # setup on cold probes does not widen the offset sample or the one-way split
+                request_sent_ns = timings.get('request_sent_ns', local_start_time_ns)
+                headers_received_ns = timings.get('headers_received_ns', local_finish_time_ns)
+                results.update(estimator.correct(request_sent_ns, server_time_ns, headers_received_ns))
+            results.update(phase_durations(timings))
+            logging.debug("Latency measurement results: %s", results)
             return results
         logging.error("Server time not fetched; latency measurement failed.")
         return None
     except Exception as e:
-        logging.error(f"Error during latency measurement: {e}")
+        logging.error("Error during latency measurement: %s", e)
+        return None
+
+async def measure_raw_latency(client, target, estimator=None):
+    # Nothing is logged or formatted until the response is complete
+    try:
+        response = await client.request()
+        server_time_ns = server_time_from_response(response, target['parser'])
+    except Exception as e:
+        logging.error("Error during raw latency measurement: %s", e)
         return None
+    results = {
+        "timestamp_ns": response.last_byte_ns,
+        "round_trip_time_ns": response.last_byte_ns - response.request_sent_ns,
+        "ttfb_ns": response.first_byte_ns - response.request_sent_ns,
+        "body_ns": response.last_byte_ns - response.first_byte_ns,
+        "connection_reused": response.connection_reused,
+    }
+    if server_time_ns is not NO_SERVER_TIME:
+        if estimator is None:
+            estimator = get_clock_offset_estimator(target['url'])
+        results.update(estimator.correct(response.request_sent_ns, server_time_ns, response.first_byte_ns))
+    return results
+
+def measure_target_latency(session, target):
+    return measure_latency(session, target['url'], parser=RESPONSE_PARSERS[target['parser']])
+
+async def measure_target_latency_limited(session, target, semaphore, on_result):
+    # Waiting for a concurrency slot happens outside the timed region
+    async with semaphore:
+        on_result(await measure_target_latency(session, target))
+
+def create_result_handler(stats, target, mode, sample_sink=None):
+    # Results are handed on as each probe completes, so a sink sees them in completion order
+    def on_result(result):
+        stats.record(result)
+        if sample_sink is not None:
+            sample_sink(target['name'], mode, result)
+    return on_result
+
+def combine_sample_sinks(*sinks):
+    # One sink out of several (e.g. the sample store and the metrics exporter); None if there are none
+    sinks = [sink for sink in sinks if sink is not None]
+    if len(sinks) <= 1:
+        return sinks[0] if sinks else None
+
+    def sample_sink(target_name, mode, result):
+        for sink in sinks:
+            sink(target_name, mode, result)
+    return sample_sink
+
+def create_probe_session(mode, pool_size, resolver=None, local_address=None):
+    local_addr = (local_address, 0) if local_address else None
+    if mode == 'cold':
+        connector = aiohttp.TCPConnector(force_close=True, use_dns_cache=False, resolver=resolver, local_addr=local_addr)
+    else:
+        connector = aiohttp.TCPConnector(limit=pool_size, resolver=resolver, local_addr=local_addr)
+    return aiohttp.ClientSession(connector=connector, trace_configs=[create_phase_trace_config()])
+
+async def warm_up_session(session, target, pool_size):
+    # Fill the keep-alive pool with one connection per concurrent probe so every
+    # measured request reuses an established connection
+    logging.debug(f"Pre-warming {pool_size} connections to {target['url']}")
+    parser = RESPONSE_PARSERS[target['parser']]
+    await asyncio.gather(*[fetch_server_time(session, target['url'], parser=parser) for _ in range(pool_size)])
+
+async def perform_mode_checks_async(target, mode, sample_sink=None, resolver=None, label=None, local_address=None):
+    # `label` is the mode name results are reported under, if not `mode` itself
+    label = label or mode
+    logging.debug(f"Performing {label} latency checks for {target['name']}")
+    try:
+        async with create_probe_session(mode, target['max_connections'], resolver, local_address) as session:
+            if mode == 'warm':
+                await warm_up_session(session, target, min(target['concurrency'], target['max_connections']))
+            stats = LatencyStats(METRICS)
+            on_result = create_result_handler(stats, target, label, sample_sink)
+            semaphore = asyncio.Semaphore(target['concurrency'])
+            tasks = [measure_target_latency_limited(session, target, semaphore, on_result) for _ in range(target['number_of_checks'])]
+            await asyncio.gather(*tasks)
+            logging.debug(f"Completed {label} latency checks for {target['name']} with {stats.count} valid results")
+            return stats
+    except Exception as e:
+        logging.error(f"Error performing {label} latency checks for {target['name']}: {e}")
+        return LatencyStats(METRICS)
+
+async def perform_edge_checks_async(target, sample_sink=None):
+    # Warm probes against each resolved address in turn, one pool per address, so edges
+    # never compete for the loop; DNS is resolved before any probe and stays out of the numbers
+    parsed = urlparse(target['url'])
+    address_cache = get_address_cache(target)
+    try:
+        addresses = await address_cache.resolve(parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80))
+    except OSError as e:
+        logging.error(f"Error resolving edge addresses for {target['name']}: {e}")
+        return {}
+    stats_by_edge = {}
+    for address in addresses:
+        edge_sink = edge_sample_sink(sample_sink, address_cache.slot(parsed.hostname, address), address)
+        stats_by_edge[edge_mode(address)] = await perform_mode_checks_async(target, 'warm', edge_sink, PinnedResolver(address),
+                                                                            edge_mode(address))
+    return stats_by_edge
+
+def print_open_loop_report(target_name, report, late_threshold_ms):
+    table = PrettyTable()
+    table.field_names = ["Metric", "Value"]
+    table.add_row(["Target Rate (req/s)", f"{report.target_rate_per_second:.1f}"])
+    table.add_row(["Achieved Rate (req/s)", f"{report.achieved_rate_per_second:.1f}"])
+    table.add_row(["Probes Scheduled", report.scheduled])
+    table.add_row(["Probes Completed", report.completed])
+    table.add_row(["Dropped (in-flight cap)", report.dropped])
+    table.add_row([f"Late (> {late_threshold_ms} ms)", report.late])
+    table.add_row(["Max Send Lag (ms)", format_ms(report.max_send_lag_ns)])
+    print(colored(f"{target_name} open-loop load", "blue"))
+    print(colored(table, "magenta"))
+    logging.info(f"Open-loop load for {target_name}: target {report.target_rate_per_second:.1f} req/s, achieved {report.achieved_rate_per_second:.1f} req/s, "
+                 f"{report.completed}/{report.scheduled} completed, {report.dropped} dropped, {report.late} late, "
+                 f"max send lag {format_ms(report.max_send_lag_ns)} ms")
+
+async def perform_open_loop_checks_async(target, sample_sink=None, on_report=None):
+    load_test = target['load_test']
+    stats = LatencyStats(METRICS)
+    logging.debug(f"Performing open-loop latency checks for {target['name']} at {load_test['rate_per_second']} req/s")
+    try:
+        async with create_probe_session('warm', load_test['max_in_flight']) as session:
+            await warm_up_session(session, target, min(target['concurrency'], load_test['max_in_flight']))
+            report = await run_open_loop(lambda: measure_target_latency(session, target), load_test['rate_per_second'],
+                                         load_test['duration_seconds'], load_test['max_in_flight'],
+                                         load_test['late_threshold_ms'] * 1e6,
+                                         create_result_handler(stats, target, 'open_loop', sample_sink))
+    except Exception as e:
+        logging.error(f"Error performing open-loop latency checks for {target['name']}: {e}")
+        return stats
 
-async def perform_latency_checks_async(config):
-    logging.debug("Performing latency checks")
+    if on_report is not None:
+        on_report(target, report)
+    else:
+        print_open_loop_report(target['name'], report, load_test['late_threshold_ms'])
+    return stats
+
+async def perform_websocket_checks_async(target, sample_sink=None):
+    websocket = target['websocket']
+    stats = LatencyStats(METRICS)
+    on_result = create_result_handler(stats, target, 'websocket', sample_sink)
+    # Stream timestamps are in exchange time; the offset comes from the REST probes of the same target
+    estimator = get_clock_offset_estimator(target['url'])
+
+    def on_stream_message(topic, exchange_ts_ns, receive_ns):
+        result = {"timestamp_ns": receive_ns}
+        estimate = estimator.estimate()
+        if estimate is None:
+            result['delivery_delay_ns'] = receive_ns - exchange_ts_ns
+        else:
+            offset_ns, error_ns = estimate
+            result.update(delivery_delay_ns=int(receive_ns - (exchange_ts_ns - offset_ns)), clock_offset_ns=offset_ns, offset_error_ns=error_ns)
+        on_result(result)
+
+    logging.debug(f"Performing WebSocket latency checks for {target['name']} at {websocket['ping_rate_per_second']} pings/s")
+    probe = get_websocket_probe(target)
     try:
-        async with aiohttp.ClientSession() as session:
-            tasks = [measure_latency(session, config['api_endpoint']) for _ in range(config['number_of_checks'])]
-            results = await asyncio.gather(*tasks)
-            valid_results = [result for result in results if result]
-            logging.debug(f"Completed latency checks with {len(valid_results)} valid results")
-            return valid_results
+        await probe.connect()
+        probe.on_stream_message = on_stream_message
+        report = await run_open_loop(lambda: probe.ping(websocket['ping_timeout_seconds']), websocket['ping_rate_per_second'],
+                                     websocket['duration_seconds'], target['concurrency'], target['load_test']['late_threshold_ms'] * 1e6, on_result)
+        logging.info(f"WebSocket pings for {target['name']}: {report.completed}/{report.scheduled} answered, {report.dropped} dropped, "
+                     f"{stats.histograms['delivery_delay_ns'].count} stream messages timed")
     except Exception as e:
-        logging.error(f"Error performing latency checks: {e}")
-        return []
+        logging.error(f"Error performing WebSocket latency checks for {target['name']}: {e}")
+    finally:
+        probe.on_stream_message = None
+    return stats
+
+async def perform_source_checks_async(target, sample_sink=None):
+    # Unlike edges, all source addresses are probed at once, so every uplink sees the same moment
+    entries = target['source_addresses']
+
+    async def perform_entry_checks(entry):
+        # An entry that cannot be looked up (e.g. a mistyped interface) reports no probes, like an unbound address
+        try:
+            address = source_address(entry)
+        except OSError as e:
+            logging.error(f"Error looking up source address {entry} for {target['name']}: {e}")
+            return LatencyStats(METRICS)
+        return await perform_mode_checks_async(target, 'warm', sample_sink, label=source_mode(entry), local_address=address)
+
+    results = await asyncio.gather(*[perform_entry_checks(entry) for entry in entries])
+    return {source_mode(entry): stats for entry, stats in zip(entries, results)}
 
-def calculate_and_print_statistics(results):
+async def perform_raw_checks_async(target, sample_sink=None):
+    stats = LatencyStats(METRICS)
+    on_result = create_result_handler(stats, target, 'raw', sample_sink)
+    client = RawHttpClient(target['url'], min(target['concurrency'], target['max_connections']))
+    logging.debug(f"Performing raw latency checks for {target['name']} over {client.pool_size} connections")
+    try:
+        await client.connect()
+        # One unmeasured request per connection, like the warm pool's pre-warming
+        await asyncio.gather(*[client.request() for _ in range(client.pool_size)])
+
+        async def probe():
+            on_result(await measure_raw_latency(client, target))
+        await asyncio.gather(*[probe() for _ in range(target['number_of_checks'])])
+    except Exception as e:
+        logging.error(f"Error performing raw latency checks for {target['name']}: {e}")
+    finally:
+        client.close()
+    return stats
+
+async def perform_target_checks_async(target, sample_sink=None, on_report=None):
+    # Modes run one after the other so cold handshakes never compete with warm probes.
+    # `on_report(target, report)` takes the open-loop report instead of printing it.
+    stats_by_mode = {}
+    for mode in target['probe_modes']:
+        if mode == 'open_loop':
+            stats_by_mode[mode] = await perform_open_loop_checks_async(target, sample_sink, on_report)
+        elif mode == 'websocket':
+            stats_by_mode[mode] = await perform_websocket_checks_async(target, sample_sink)
+        elif mode == 'raw':
+            stats_by_mode[mode] = await perform_raw_checks_async(target, sample_sink)
+        elif mode == 'edges':
+            stats_by_mode.update(await perform_edge_checks_async(target, sample_sink))
+        elif mode == 'sources':
+            stats_by_mode.update(await perform_source_checks_async(target, sample_sink))
+        else:
+            stats_by_mode[mode] = await perform_mode_checks_async(target, mode, sample_sink)
+    return stats_by_mode
+
+async def perform_latency_checks_async(config, sample_sink=None):
+    # Every target gets its own pools and limits; all of them are probed concurrently.
+    # `sample_sink(target_name, mode, result)` sees every probe, failures as None.
+    targets = load_targets(config)
+    results = await asyncio.gather(*[perform_target_checks_async(target, sample_sink) for target in targets])
+    return {target['name']: stats_by_mode for target, stats_by_mode in zip(targets, results)}
+
+def format_ms(value_ns):
+    return "-" if value_ns is None else f"{value_ns / 1e6:.2f}"
+
+def build_statistics_table(stats):
+    table = PrettyTable()
+    table.field_names = ["Metric", "Count", "Average (ms)"] + [f"p{percentile:g} (ms)" for percentile in PERCENTILES] + ["Max (ms)", "Error Bound (ms)"]
+    for metric, label in METRICS.items():
+        summary = stats.summary(metric)
+        # Phases that never happened (e.g. DNS on reused connections) are left out
+        if summary is None:
+            continue
+        # One-way values inherit the offset uncertainty; report the worst bound seen
+        error_bound = f"±{stats.offset_error_ns / 1e6:.3f}" if metric in ONE_WAY_METRICS else "-"
+        table.add_row([label, summary[0]] + [format_ms(value) for value in summary[1:]] + [error_bound])
+    return table
+
+def describe_probes(mode, target=None):
+    label = f"{mode.replace('_', '-').capitalize()} probes"
+    return f"{target} · {label}" if target else label
+
+def calculate_and_print_statistics(stats, mode=None, target=None):
     logging.debug("Calculating and displaying statistics for latency measurements")
-    if not results:
+    if not stats.count:
         logging.info("No valid latency data to display.")
         return
-    
-    round_trip_times_ms = [result['round_trip_time_ns'] / 1e6 for result in results]
-    server_to_exchange_times_ms = [result['server_to_exchange_ns'] / 1e6 for result in results]
-    exchange_to_server_times_ms = [result['exchange_to_server_ns'] / 1e6 for result in results]
 
+    for metric, label in METRICS.items():
+        summary = stats.summary(metric)
+        if summary is not None:
+            percentiles = ", ".join(f"p{percentile:g}: {format_ms(value)} ms" for percentile, value in zip(PERCENTILES, summary[2:-1]))
+            logging.debug(f"{label} - Count: {summary[0]}, Avg: {format_ms(summary[1])} ms, {percentiles}, Max: {format_ms(summary[-1])} ms")
+    if mode:
+        print(colored(f"{describe_probes(mode, target)} ({stats.reused_connections}/{stats.count} on reused connections, {stats.failures} failed)", "blue"))
+    print(colored(build_statistics_table(stats), "yellow"))
+    # Status-only targets carry no exchange timestamp, hence no clock offset
+    if stats.clock_offset_ns is not None:
+        clock_offset_ms = stats.clock_offset_ns / 1e6
+        offset_error_ms = stats.offset_error_ns / 1e6
+        logging.debug(f"Clock offset (exchange - local): {clock_offset_ms:.3f} ms ± {offset_error_ms:.3f} ms")
+        print(colored(f"Clock offset (exchange - local): {clock_offset_ms:+.3f} ms ± {offset_error_ms:.3f} ms", "cyan"))
+
+def print_target_summary(stats_by_target):
+    # One row per target and mode, round-trip time only, for a side-by-side view
     table = PrettyTable()
-    table.field_names = ["Metric", "Average (ms)", "Median (ms)", "95th Percentile (ms)"]
-    metrics = ["Round Trip Time", "Server to Exchange", "Exchange to Server"]
-    for metric, values in zip(metrics, [round_trip_times_ms, server_to_exchange_times_ms, exchange_to_server_times_ms]):
-        avg = np.mean(values)
-        median = np.median(values)
-        percentile_95 = np.percentile(values, 95)
-        table.add_row([metric, f"{avg:.2f}", f"{median:.2f}", f"{percentile_95:.2f}"])
-        logging.debug(f"{metric} - Avg: {avg:.2f} ms, Median: {median:.2f} ms, 95th Percentile: {percentile_95:.2f} ms")
-    
-    print(colored(table, "yellow"))
+    table.field_names = ["Target", "Mode", "Probes", "Failed", "Average (ms)", "p50 (ms)", "p99 (ms)", "Max (ms)", "Clock Offset (ms)"]
+    for target, stats_by_mode in stats_by_target.items():
+        for mode, stats in stats_by_mode.items():
+            summary = stats.summary("round_trip_time_ns") or [0] + [None] * (len(PERCENTILES) + 2)
+            p50, p99 = summary[2 + PERCENTILES.index(50)], summary[2 + PERCENTILES.index(99)]
+            clock_offset = "-" if stats.clock_offset_ns is None else f"{stats.clock_offset_ns / 1e6:+.3f}"
+            table.add_row([target, mode, summary[0], stats.failures, format_ms(summary[1]), format_ms(p50), format_ms(p99), format_ms(summary[-1]), clock_offset])
+            logging.info(f"{target} {mode}: {summary[0]} probes, {stats.failures} failed, RTT avg {format_ms(summary[1])} ms, "
+                         f"p50 {format_ms(p50)} ms, p99 {format_ms(p99)} ms, max {format_ms(summary[-1])} ms")
+    print(colored(table, "green"))
 
 async def main():
     logging.info("Starting the latency check script")
     try:
         config = load_config()
-        results = await perform_latency_checks_async(config)
-        calculate_and_print_statistics(results)
+        store = SampleStore(config['sample_store_path'], METRICS) if config.get('sample_store_path') else None
+        ndjson = NdjsonSampleWriter(config['sample_ndjson_path']) if config.get('sample_ndjson_path') else None
+        try:
+            stats_by_target = await perform_latency_checks_async(config, combine_sample_sinks(store.append if store else None,
+                                                                                              ndjson.record if ndjson else None))
+        finally:
+            await close_websocket_probes()
+            if store:
+                store.close()
+            if ndjson:
+                ndjson.close()
+        for target, stats_by_mode in stats_by_target.items():
+            for mode, stats in stats_by_mode.items():
+                calculate_and_print_statistics(stats, mode, target)
+        print_target_summary(stats_by_target)
+        for target, stats_by_mode in stats_by_target.items():
+            print_edge_ranking(target, stats_by_mode)
+            print_source_comparison(target, stats_by_mode)
     except Exception as e:
         logging.error(f"Unhandled exception in main: {e}")
     logging.info("Latency check script execution completed")
 
 if __name__ == '__main__':
+    configure_logging()
     asyncio.run(main())
@@ -0,0 +1,83 @@
+import asyncio
+from timing import monotonic_ns
+
+
+class OpenLoopReport:
+    def __init__(self, target_rate_per_second):
+        self.target_rate_per_second = target_rate_per_second
+        self.scheduled = 0
+        self.sent = 0
+        self.completed = 0
+        self.dropped = 0
+        self.late = 0
+        self.max_send_lag_ns = 0
+        self.elapsed_ns = 0
+
+    @property
+    def achieved_rate_per_second(self):
+        return self.sent / (self.elapsed_ns / 1e9) if self.elapsed_ns else 0.0
+
+    def merge(self, other):
+        # Reports of schedules that ran side by side (e.g. shards of one target in a fleet)
+        self.target_rate_per_second += other.target_rate_per_second
+        for counter in ("scheduled", "sent", "completed", "dropped", "late"):
+            setattr(self, counter, getattr(self, counter) + getattr(other, counter))
+        self.max_send_lag_ns = max(self.max_send_lag_ns, other.max_send_lag_ns)
+        self.elapsed_ns = max(self.elapsed_ns, other.elapsed_ns)
+        return self
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        report = cls(data["target_rate_per_second"])
+        vars(report).update(data)
+        return report
+
+
+async def run_open_loop(probe, rate_per_second, duration_seconds, max_in_flight, late_threshold_ns, on_result):
+    """Fire `probe()` on a fixed schedule, independent of how fast earlier probes return.
+
+    Probe i is due at start + i / rate. A probe sent behind schedule counts as
+    late, and one that finds `max_in_flight` probes outstanding is dropped
+    rather than queued. Every result gets `intended_latency_ns`, measured from
+    the due time instead of the actual send, so client-side stalls show up in
+    the tail instead of being silently omitted.
+    """
+    interval_ns = 1e9 / rate_per_second
+    total_probes = int(rate_per_second * duration_seconds)
+    report = OpenLoopReport(rate_per_second)
+    in_flight = set()
+
+    async def fire(intended_send_ns):
+        result = await probe()
+        if result:
+            result['intended_latency_ns'] = monotonic_ns() - intended_send_ns
+            report.completed += 1
+        on_result(result)
+
+    start_ns = monotonic_ns()
+    for i in range(total_probes):
+        intended_send_ns = start_ns + int(i * interval_ns)
+        delay_ns = intended_send_ns - monotonic_ns()
+        if delay_ns > 0:
+            await asyncio.sleep(delay_ns / 1e9)
+        report.scheduled += 1
+        send_lag_ns = monotonic_ns() - intended_send_ns
+        report.max_send_lag_ns = max(report.max_send_lag_ns, send_lag_ns)
+        if send_lag_ns > late_threshold_ns:
+            report.late += 1
+        if len(in_flight) >= max_in_flight:
+            report.dropped += 1
+            continue
+        task = asyncio.create_task(fire(intended_send_ns))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        report.sent += 1
+    # The last slot lasts one interval too, otherwise N probes would span only N - 1 intervals
+    report.elapsed_ns = monotonic_ns() - start_ns + int(interval_ns)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return report
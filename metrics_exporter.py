@@ -0,0 +1,192 @@
+import logging
+from collections import deque
+import numpy as np
+from aiohttp import web
+from histogram import PERCENTILES, LatencyStats, bucket_index
+from edges import edge_address_changed
+from latency_bot import ONE_WAY_METRICS
+from timing import monotonic_ns
+
+# Classic `le` buckets in seconds. Prometheus native histograms need the protobuf
+# exposition format, so the fixed-size LatencyHistograms are folded into these bounds
+# at scrape time instead; the fold costs the same however many probes were recorded.
+# One-way delays go negative under clock skew, which a histogram cannot hold, so
+# they are exported as quantile gauges instead, over the samples of the last
+# ONE_WAY_WINDOW_SECONDS (at most ONE_WAY_WINDOW_SAMPLES each) so a lag spike shows
+# within a scrape interval rather than being averaged into the whole run.
+BUCKET_BOUNDS_SECONDS = [0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.003, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03,
+                         0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+_BOUND_BUCKET_INDEXES = [bucket_index(int(bound * 1e9)) for bound in BUCKET_BOUNDS_SECONDS]
+METRIC_PREFIX = "latencygroove"
+ONE_WAY_WINDOW_SECONDS = 60
+ONE_WAY_WINDOW_SAMPLES = 4096
+DEFAULT_EXPORTER_HOST = "0.0.0.0"
+DEFAULT_EXPORTER_PORT = 9108
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}" if labels else ""
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Family:
+    def __init__(self, name, metric_type, help_text):
+        self.name = name
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.samples = []
+
+    def add(self, labels, value, suffix=""):
+        self.samples.append((suffix, labels, value))
+
+    def render(self, openmetrics):
+        # OpenMetrics names a counter family without `_total`, the 0.0.4 text format with it
+        family_name = self.name[:-len("_total")] if openmetrics and self.metric_type == "counter" else self.name
+        lines = [f"# HELP {family_name} {self.help_text}", f"# TYPE {family_name} {self.metric_type}"]
+        lines += [f"{self.name}{suffix}{_labels(labels)} {_number(value)}" for suffix, labels, value in self.samples]
+        return lines
+
+
+class MetricsExporter:
+    """Prometheus/OpenMetrics view of the watchdog, served from the probe loop.
+
+    Probe results arrive through `record`, which matches the sample sink signature of
+    perform_latency_checks_async, so histograms move with every completed probe instead
+    of once per cycle. Everything kept here is fixed-size per target and mode.
+    """
+
+    def __init__(self, metrics, hop_history=None):
+        self.metrics = list(metrics)
+        self.stats = {}
+        # (target, mode) -> metric -> deque of (monotonic ns, value ns)
+        self.one_way = {}
+        # (target, mode) -> (offset ns, error ns) of the estimator at the latest probe
+        self.offsets = {}
+        self.edge_addresses = {}
+        self.hop_history = hop_history
+        self.diagnostics = {}
+        self.runner = None
+
+    def record(self, target, mode, result):
+        key = (target, mode)
+        if edge_address_changed(self.edge_addresses, key, result):
+            # The edge slot now points at another address; its series starts over
+            for state in (self.stats, self.one_way, self.offsets):
+                state.pop(key, None)
+        if key not in self.stats:
+            self.stats[key] = LatencyStats(self.metrics)
+        self.stats[key].record(result)
+        if not result:
+            return
+        now_ns = monotonic_ns()
+        for metric in ONE_WAY_METRICS:
+            if result.get(metric) is not None:
+                window = self.one_way.setdefault(key, {}).setdefault(metric, deque(maxlen=ONE_WAY_WINDOW_SAMPLES))
+                window.append((now_ns, result[metric]))
+        if result.get('clock_offset_ns') is not None:
+            self.offsets[key] = (result['clock_offset_ns'], result['offset_error_ns'])
+
+    def record_diagnostics(self, host, results, timestamp_ns):
+        for result in results:
+            self.diagnostics[(host, result['tool'])] = (result, timestamp_ns)
+
+    def render(self, openmetrics=False):
+        latency = _Family(f"{METRIC_PREFIX}_probe_latency_seconds", "histogram",
+                          "Probe latency per target, probe mode and phase.")
+        probes = _Family(f"{METRIC_PREFIX}_probes_total", "counter", "Completed probes per target and probe mode.")
+        failures = _Family(f"{METRIC_PREFIX}_probe_failures_total", "counter", "Failed probes per target and probe mode.")
+        reused = _Family(f"{METRIC_PREFIX}_probe_reused_connections_total", "counter",
+                         "Probes that went out on an already open connection.")
+        one_way = _Family(f"{METRIC_PREFIX}_one_way_delay_seconds", "gauge",
+                          "One-way delay quantiles over the last minute per target, probe mode and phase; negative under clock skew.")
+        offset = _Family(f"{METRIC_PREFIX}_clock_offset_seconds", "gauge", "Current estimate of exchange clock minus local clock.")
+        offset_error = _Family(f"{METRIC_PREFIX}_clock_offset_error_seconds", "gauge", "Error bound of the current clock offset estimate.")
+
+        window_start_ns = monotonic_ns() - ONE_WAY_WINDOW_SECONDS * 1e9
+        for (target, mode), stats in sorted(self.stats.items()):
+            labels = {"target": target, "mode": mode}
+            probes.add(labels, stats.count)
+            failures.add(labels, stats.failures)
+            reused.add(labels, stats.reused_connections)
+            if (target, mode) in self.offsets:
+                offset_ns, error_ns = self.offsets[(target, mode)]
+                offset.add(labels, offset_ns / 1e9)
+                offset_error.add(labels, error_ns / 1e9)
+            for metric, window in self.one_way.get((target, mode), {}).items():
+                values = [value for timestamp_ns, value in window if timestamp_ns >= window_start_ns]
+                if values:
+                    quantiles = np.percentile(values, PERCENTILES)
+                    for percentile, value in zip(PERCENTILES, quantiles):
+                        one_way.add({**labels, "phase": metric[:-len("_ns")], "quantile": f"{percentile / 100:g}"}, float(value) / 1e9)
+            for metric in stats.metrics:
+                histogram = stats.histograms[metric]
+                if not histogram.count:
+                    continue
+                phase_labels = {**labels, "phase": metric[:-len("_ns")]}
+                if metric in ONE_WAY_METRICS:
+                    continue
+                cumulative = np.cumsum(histogram.positive_counts)
+                for bound, index in zip(BUCKET_BOUNDS_SECONDS, _BOUND_BUCKET_INDEXES):
+                    latency.add({**phase_labels, "le": _number(bound)}, int(cumulative[index]), "_bucket")
+                latency.add({**phase_labels, "le": "+Inf"}, histogram.count, "_bucket")
+                latency.add(phase_labels, histogram.total_ns / 1e9, "_sum")
+                latency.add(phase_labels, histogram.count, "_count")
+
+        families = [latency, one_way, probes, failures, reused, offset, offset_error] + self._diagnostics_families()
+        lines = [line for family in families if family.samples for line in family.render(openmetrics)]
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def _diagnostics_families(self):
+        success = _Family(f"{METRIC_PREFIX}_diagnostics_success", "gauge", "1 if the last run of the tool finished cleanly.")
+        duration = _Family(f"{METRIC_PREFIX}_diagnostics_duration_seconds", "gauge", "Wall time of the last run of the tool.")
+        last_run = _Family(f"{METRIC_PREFIX}_diagnostics_last_run_timestamp_seconds", "gauge", "When the tool last finished.")
+        for (host, tool), (result, timestamp_ns) in sorted(self.diagnostics.items()):
+            labels = {"host": host, "tool": tool}
+            success.add(labels, int(result['error'] is None))
+            duration.add(labels, result['elapsed_ns'] / 1e9)
+            last_run.add(labels, timestamp_ns / 1e9)
+        families = [success, duration, last_run]
+        if self.hop_history is None:
+            return families
+
+        hop_latency = _Family(f"{METRIC_PREFIX}_hop_latency_seconds", "gauge", "Average latency to a hop in the latest diagnostics run.")
+        hop_loss = _Family(f"{METRIC_PREFIX}_hop_loss_ratio", "gauge", "Packet loss to a hop in the latest diagnostics run.")
+        hosts_and_tools = sorted({(host, tool) for host, tool, _ in self.hop_history.series})
+        for host, tool in hosts_and_tools:
+            for record, _ in self.hop_history.changes(host, tool):
+                labels = {"host": host, "tool": tool, "hop": "" if record.hop is None else record.hop, "ip": record.ip or ""}
+                hop_loss.add(labels, record.loss_pct / 100)
+                if record.avg_ms is not None:
+                    hop_latency.add(labels, record.avg_ms / 1e3)
+        return families + [hop_latency, hop_loss]
+
+    async def handle_metrics(self, request):
+        openmetrics = "application/openmetrics-text" in request.headers.get("Accept", "")
+        return web.Response(body=self.render(openmetrics).encode(),
+                            headers={"Content-Type": OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE})
+
+    async def start(self, host=DEFAULT_EXPORTER_HOST, port=DEFAULT_EXPORTER_PORT):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
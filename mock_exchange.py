@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from aiohttp import web, WSMsgType
+
+# Local stand-in for the Bybit endpoints the watchdog probes, so probes can be
+# exercised and benchmarked without api.bybit.com:
+#   GET /v5/market/time     REST server time
+#   WS  /v5/public/linear   {"op": "ping"} -> {"op": "pong", ...}, and a tickers stream
+#   GET /mock/stats         server-side handling time of the requests above (?reset=1 clears)
+# The exchange clock runs `skew_ms` ahead of the local one. Every request is
+# delayed by a draw from the latency distribution, `asymmetry` of it before the
+# timestamp is taken and the rest after; a share of requests fails (`error_rate`)
+# or stalls for `stall_ms` on top (`stall_rate`).
+
+LATENCY_DISTRIBUTIONS = {
+    # name -> (parameter names, sampler returning ms)
+    "constant": (["ms"], lambda ms: ms),
+    "uniform": (["low_ms", "high_ms"], lambda low_ms, high_ms: random.uniform(low_ms, high_ms)),
+    "normal": (["mean_ms", "stdev_ms"], lambda mean_ms, stdev_ms: max(0.0, random.gauss(mean_ms, stdev_ms))),
+    "lognormal": (["median_ms", "sigma"], lambda median_ms, sigma: random.lognormvariate(math.log(median_ms), sigma)),
+    "exponential": (["mean_ms"], lambda mean_ms: random.expovariate(1 / mean_ms)),
+}
+
+
+def parse_latency(spec):
+    # "constant:2", "uniform:1,3", "lognormal:2,0.5", ...; empty or "none" for no delay
+    if not spec or spec == "none":
+        return None
+    name, _, arguments = spec.partition(':')
+    if name not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution '{name}', expected one of {list(LATENCY_DISTRIBUTIONS)}")
+    parameter_names, _ = LATENCY_DISTRIBUTIONS[name]
+    values = [float(value) for value in arguments.split(',')] if arguments else []
+    if len(values) != len(parameter_names):
+        raise ValueError(f"Latency distribution '{name}' takes {', '.join(parameter_names)}")
+    return {"distribution": name, **dict(zip(parameter_names, values))}
+
+
+class HandlingStats:
+    """Welford running mean/variance of server-side handling time, in ns."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean_ns = 0.0
+        self.m2 = 0.0
+
+    def record(self, value_ns):
+        self.count += 1
+        delta = value_ns - self.mean_ns
+        self.mean_ns += delta / self.count
+        self.m2 += delta * (value_ns - self.mean_ns)
+
+    def to_dict(self):
+        stdev_ns = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+        return {"count": self.count, "mean_ns": self.mean_ns, "stdev_ns": stdev_ns}
+
+
+class MockExchange:
+    def __init__(self, skew_ms=0.0, stream_interval_ms=100, latency=None, asymmetry=0.5, error_rate=0.0, stall_rate=0.0, stall_ms=0.0,
+                 echo_req_id=True):
+        self.skew_ns = int(skew_ms * 1e6)
+        self.stream_interval_seconds = stream_interval_ms / 1e3
+        self.latency = latency
+        self.asymmetry = asymmetry
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_ms / 1e3
+        # Spot endpoints answer pings without echoing req_id
+        self.echo_req_id = echo_req_id
+        self.handling = HandlingStats()
+        self.runner = None
+
+    def exchange_time_ns(self):
+        return time.time_ns() + self.skew_ns
+
+    def draw_delay_seconds(self):
+        delay_ms = 0.0
+        if self.latency is not None:
+            parameters = dict(self.latency)
+            _, sampler = LATENCY_DISTRIBUTIONS[parameters.pop("distribution")]
+            delay_ms = sampler(**parameters)
+        if self.stall_rate and random.random() < self.stall_rate:
+            delay_ms += self.stall_seconds * 1e3
+        return delay_ms / 1e3
+
+    async def _delayed(self, build_response):
+        # Returns build_response(exchange time) after the injected delay, split around the timestamp
+        start_ns = time.perf_counter_ns()
+        delay_seconds = self.draw_delay_seconds()
+        if delay_seconds:
+            await asyncio.sleep(delay_seconds * self.asymmetry)
+        response = build_response(self.exchange_time_ns())
+        if delay_seconds:
+            await asyncio.sleep(delay_seconds * (1 - self.asymmetry))
+        self.handling.record(time.perf_counter_ns() - start_ns)
+        return response
+
+    async def handle_time(self, request):
+        if self.error_rate and random.random() < self.error_rate:
+            return web.json_response({"retCode": 10016, "retMsg": "Server error", "result": {}}, status=503)
+        return await self._delayed(lambda now_ns: web.json_response({
+            "retCode": 0, "retMsg": "OK", "result": {"timeSecond": str(now_ns // 10**9), "timeNano": str(now_ns)}, "time": now_ns // 10**6}))
+
+    async def handle_stats(self, request):
+        stats = self.handling.to_dict()
+        if request.query.get('reset'):
+            self.handling = HandlingStats()
+        return web.json_response(stats)
+
+    async def handle_websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = []
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                request_json = json.loads(message.data)
+                if request_json.get('op') == 'ping':
+                    if self.error_rate and random.random() < self.error_rate:
+                        continue  # A lost pong
+                    req_id = request_json.get('req_id', "") if self.echo_req_id else ""
+                    await ws.send_str(await self._delayed(lambda now_ns: json.dumps({
+                        "op": "pong", "req_id": req_id, "args": [str(now_ns // 10**6)], "conn_id": "mock"})))
+                elif request_json.get('op') == 'subscribe':
+                    await ws.send_str(json.dumps({"success": True, "ret_msg": "", "op": "subscribe", "conn_id": "mock"}))
+                    streams += [asyncio.create_task(self._stream(ws, topic)) for topic in request_json.get('args', [])]
+        finally:
+            for stream in streams:
+                stream.cancel()
+        return ws
+
+    async def _stream(self, ws, topic):
+        while not ws.closed:
+            await ws.send_str(json.dumps({"topic": topic, "type": "snapshot", "ts": self.exchange_time_ns() // 10**6,
+                                          "data": {"symbol": topic.split('.')[-1], "lastPrice": "50000.00"}}))
+            await asyncio.sleep(self.stream_interval_seconds)
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_get('/v5/market/time', self.handle_time)
+        app.router.add_get('/v5/public/linear', self.handle_websocket)
+        app.router.add_get('/mock/stats', self.handle_stats)
+        return app
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.runner = web.AppRunner(self.create_app(), access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+def add_mock_arguments(parser):
+    parser.add_argument('--skew-ms', type=float, default=0.0, help="exchange clock minus local clock")
+    parser.add_argument('--latency', default=None, help="injected delay, e.g. constant:2, uniform:1,3, lognormal:2,0.5, exponential:2")
+    parser.add_argument('--asymmetry', type=float, default=0.5, help="share of the delay spent before the timestamp is taken")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with HTTP 503 (or no pong)")
+    parser.add_argument('--stall-rate', type=float, default=0.0, help="share of requests that stall")
+    parser.add_argument('--stall-ms', type=float, default=200.0, help="extra delay of a stalled request")
+    parser.add_argument('--stream-interval-ms', type=float, default=100)
+    parser.add_argument('--no-req-id', action='store_true', help="answer WebSocket pings without echoing req_id")
+
+
+def mock_from_arguments(args):
+    return MockExchange(args.skew_ms, args.stream_interval_ms, parse_latency(args.latency), args.asymmetry,
+                        args.error_rate, args.stall_rate, args.stall_ms, not args.no_req_id)
+
+
+async def serve(args):
+    exchange = mock_from_arguments(args)
+    await exchange.start(args.host, args.port)
+    print(f"Mock exchange on http://{args.host}:{args.port}/v5/market/time and ws://{args.host}:{args.port}/v5/public/linear", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await exchange.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the exchange endpoints the watchdog probes")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    add_mock_arguments(parser)
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,8 @@
 import asyncio
 import logging
 import json
-import subprocess
 from aiohttp import ClientSession
+from diagnostics import DEFAULT_DIAGNOSTICS_TIMEOUT_SECONDS, BackgroundDiagnostics, run_network_diagnostics_async
 
 # Configure logging
 logging.basicConfig(filename='latency_checks.log', level=logging.INFO,
@@ -26,20 +26,9 @@ async def perform_latency_checks_async(config):
         latencies = [latency for latency in results if latency is not None]
         return latencies
 
-def run_network_diagnostics(target):
-    diagnostics = {
-        "ping": ["ping", "-c", "4", target.split("//")[-1]],
-        "traceroute": ["traceroute", target.split("//")[-1]],
-        "mtr": ["mtr", "--report", "--report-cycles", "1", target.split("//")[-1]]
-    }
-    for tool, command in diagnostics.items():
-        try:
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            logging.info(f"{tool.upper()} Result: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error running {tool}: {e}\n{e.stderr}")
-
 async def schedule_checks_async(config):
+    # Diagnostics run next to the probes instead of blocking the loop between cycles
+    diagnostics = BackgroundDiagnostics()
     while True:
         logging.info("Starting scheduled latency checks...")
         latencies = await perform_latency_checks_async(config)
@@ -47,7 +36,8 @@ async def schedule_checks_async(config):
             average_latency = sum(latencies) / len(latencies)
             logging.info(f"Average Latency: {average_latency:.2f} ms")
         if config.get('enable_network_diagnostics', False):
-            run_network_diagnostics(config['api_endpoint'])
+            diagnostics.start(run_network_diagnostics_async(config['api_endpoint'], config.get('diagnostic_commands'),
+                                                            config.get('diagnostics_timeout_seconds', DEFAULT_DIAGNOSTICS_TIMEOUT_SECONDS)))
         await asyncio.sleep(config['scheduling_frequency_seconds'])
 
 if __name__ == '__main__':
@@ -2,8 +2,7 @@ import aiohttp
 import asyncio
 from datetime import datetime
 
-async def fetch_server_time(session):
-    url = "https://api.bybit.com/v5/market/time"
+async def fetch_server_time(session, url):
     async with session.get(url) as response:
         response_json = await response.json()
         # Assumendo che 'time_now' sia il campo che stiamo cercando e sia in nanosecondi
@@ -13,7 +12,7 @@ async def fetch_server_time(session):
 
 async def measure_latency(session, url):
     local_start_time_ns = datetime.utcnow().timestamp() * 1e9  # Converti in nanosecondi
-    server_time_now_str = await fetch_server_time(session)
+    server_time_now_str = await fetch_server_time(session, url)
     server_time_now_ns = float(server_time_now_str)  # Converti la stringa in float per nanosecondi
     local_finish_time_ns = datetime.utcnow().timestamp() * 1e9  # Converti in nanosecondi
 
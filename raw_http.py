@@ -0,0 +1,248 @@
+import asyncio
+import re
+import ssl
+from urllib.parse import urlparse
+from targets import RESPONSE_PARSERS
+from timing import wall_clock_ns
+
+# Where each known endpoint keeps its timestamp, and the multiplier to nanoseconds.
+# Only these bytes are looked at; the rest of the body is never parsed.
+RAW_TIME_FIELDS = {
+    "bybit_time": (b'"timeNano"', 1),
+    "binance_time": (b'"serverTime"', 1_000_000),
+    "okx_time": (b'"ts"', 1_000_000),
+}
+_CONTENT_LENGTH = re.compile(rb'\r\ncontent-length:\s*(\d+)')
+_CHUNKED = re.compile(rb'\r\ntransfer-encoding:[^\r]*chunked')
+_CONNECTION_CLOSE = re.compile(rb'\r\nconnection:\s*close')
+_DIGITS = b'0123456789'
+
+
+def scan_int_field(buffer, key, start=0, end=None):
+    """Read the integer value of a JSON `key` straight out of `buffer[start:end]`.
+
+    Handles "key":123 and "key": "123". Raises ValueError when the key is
+    missing or its value does not end inside the range.
+    """
+    end = len(buffer) if end is None else end
+    position = buffer.find(key, start, end)
+    if position < 0:
+        raise ValueError(f"{key.decode()} not found in the response")
+    position += len(key)
+    while position < end and buffer[position] in b' :':
+        position += 1
+    quoted = position < end and buffer[position] == 0x22
+    if quoted:
+        position += 1
+    digits_end = position
+    while digits_end < end and buffer[digits_end] in _DIGITS:
+        digits_end += 1
+    terminators = b'"' if quoted else b',} \r\n\t'
+    if digits_end == position or digits_end == end or buffer[digits_end] not in terminators:
+        raise ValueError(f"{key.decode()} has no integer value")
+    return int(buffer[position:digits_end])
+
+
+def _chunked_body_end(buffer, start):
+    position = start
+    while True:
+        line_end = buffer.find(b'\r\n', position)
+        if line_end < 0:
+            return -1
+        size = int(bytes(buffer[position:line_end]).split(b';')[0], 16)
+        if size == 0:
+            # The last chunk is followed by optional trailers and an empty line
+            trailer_end = buffer.find(b'\r\n\r\n', line_end)
+            return -1 if trailer_end < 0 else trailer_end + 4
+        position = line_end + 2 + size + 2
+        if position > len(buffer):
+            return -1
+
+
+class RawResponse:
+    def __init__(self, protocol):
+        self.status = protocol.status
+        self.buffer = protocol.buffer
+        self.body_start = protocol.headers_end
+        self.body_end = protocol.body_end if protocol.body_end >= 0 else len(protocol.buffer)
+        self.chunked = protocol.chunked
+        self.request_sent_ns = protocol.request_sent_ns
+        self.first_byte_ns = protocol.first_byte_ns
+        self.headers_received_ns = protocol.headers_received_ns
+        self.last_byte_ns = protocol.last_byte_ns
+        # Cleared by RawHttpClient when the request had to open a new connection
+        self.connection_reused = True
+
+    def chunk_ranges(self):
+        # (start, end) of each chunk's data within the buffer
+        ranges, position = [], self.body_start
+        while True:
+            line_end = self.buffer.find(b'\r\n', position)
+            size = int(bytes(self.buffer[position:line_end]).split(b';')[0], 16)
+            if size == 0:
+                return ranges
+            ranges.append((line_end + 2, line_end + 2 + size))
+            position = line_end + 2 + size + 2
+
+    def body(self):
+        # Copies; only for the fallback path
+        if not self.chunked:
+            return bytes(self.buffer[self.body_start:self.body_end])
+        return b''.join(self.buffer[start:end] for start, end in self.chunk_ranges())
+
+
+def server_time_from_response(response, parser_name):
+    field = RAW_TIME_FIELDS.get(parser_name)
+    if field is not None:
+        key, multiplier = field
+        # A value cut in two by chunk framing is not found here and goes to the full parser,
+        # which also reports real errors properly
+        ranges = response.chunk_ranges() if response.chunked else [(response.body_start, response.body_end)]
+        for start, end in ranges:
+            try:
+                return scan_int_field(response.buffer, key, start, end) * multiplier
+            except ValueError:
+                continue
+    return RESPONSE_PARSERS[parser_name](response.status, response.body())
+
+
+class RawHttpProtocol(asyncio.Protocol):
+    """One keep-alive HTTP/1.1 connection, one request at a time.
+
+    Arrival times are stamped at the top of `data_received`, before anything is
+    parsed: the first chunk of a response, the chunk completing the headers and
+    the chunk completing the body.
+    """
+
+    def __init__(self):
+        self.transport = None
+        self.waiter = None
+        self.lost = False
+        self.close_after_response = False
+        self._reset()
+
+    def _reset(self):
+        self.buffer = bytearray()
+        self.status = None
+        self.headers_end = -1
+        self.body_end = -1
+        self.content_length = None
+        self.chunked = False
+        self.request_sent_ns = self.first_byte_ns = self.headers_received_ns = self.last_byte_ns = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        receive_ns = wall_clock_ns()
+        if self.first_byte_ns is None:
+            self.first_byte_ns = receive_ns
+        self.buffer += data
+        if self.headers_end < 0:
+            headers_end = self.buffer.find(b'\r\n\r\n')
+            if headers_end < 0:
+                return
+            self.headers_end = headers_end + 4
+            self.headers_received_ns = receive_ns
+            self._parse_headers()
+        if self.chunked:
+            self.body_end = _chunked_body_end(self.buffer, self.headers_end)
+        elif self.content_length is not None and len(self.buffer) >= self.headers_end + self.content_length:
+            self.body_end = self.headers_end + self.content_length
+        if self.body_end >= 0:
+            self._complete(receive_ns)
+
+    def _parse_headers(self):
+        # Header names are case-insensitive; lower-case a copy of the (small) header block only
+        headers = bytes(self.buffer[:self.headers_end]).lower()
+        self.status = int(headers[9:12])
+        content_length = _CONTENT_LENGTH.search(headers)
+        self.content_length = int(content_length.group(1)) if content_length else None
+        self.chunked = bool(_CHUNKED.search(headers))
+        self.close_after_response = bool(_CONNECTION_CLOSE.search(headers))
+        if self.status in (204, 304) or (self.content_length is None and not self.chunked and self.status < 200):
+            self.content_length = 0
+
+    def _complete(self, receive_ns):
+        self.last_byte_ns = receive_ns
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(RawResponse(self))
+
+    def connection_lost(self, exc):
+        self.lost = True
+        # A response without length or chunking ends when the server closes
+        if self.headers_end >= 0 and self.body_end < 0 and self.content_length is None and not self.chunked:
+            self._complete(wall_clock_ns())
+        elif self.waiter is not None and not self.waiter.done():
+            self.waiter.set_exception(ConnectionError(f"connection closed: {exc}" if exc else "connection closed"))
+
+    async def request(self, request_bytes, timeout_seconds):
+        self._reset()
+        self.waiter = asyncio.get_running_loop().create_future()
+        self.request_sent_ns = wall_clock_ns()
+        self.transport.write(request_bytes)
+        try:
+            return await asyncio.wait_for(self.waiter, timeout_seconds)
+        finally:
+            self.waiter = None
+            if self.close_after_response:
+                # connection_lost only runs on a later loop iteration; don't hand the connection out meanwhile
+                self.lost = True
+                self.transport.close()
+
+
+class RawHttpClient:
+    """Pool of pre-opened RawHttpProtocol connections to one URL (http or https)."""
+
+    def __init__(self, url, pool_size=1, timeout_seconds=10, ssl_context=None):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.tls = parsed.scheme == 'https'
+        self.port = parsed.port or (443 if self.tls else 80)
+        self.ssl_context = (ssl_context or ssl.create_default_context()) if self.tls else None
+        self.pool_size = pool_size
+        self.timeout_seconds = timeout_seconds
+        host_header = parsed.netloc.rsplit('@', 1)[-1]
+        path = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+        # Built once; every probe writes the same bytes
+        self.request_bytes = (f'GET {path} HTTP/1.1\r\nHost: {host_header}\r\nUser-Agent: LatencyGroove\r\n'
+                              f'Accept: application/json\r\nConnection: keep-alive\r\n\r\n').encode()
+        self.idle = None
+        self.connections = []
+
+    async def _open(self):
+        _, protocol = await asyncio.get_running_loop().create_connection(
+            RawHttpProtocol, self.host, self.port, ssl=self.ssl_context, server_hostname=self.host if self.tls else None)
+        self.connections.append(protocol)
+        return protocol
+
+    async def connect(self):
+        self.idle = asyncio.Queue()
+        for protocol in await asyncio.gather(*[self._open() for _ in range(self.pool_size)]):
+            self.idle.put_nowait(protocol)
+
+    async def request(self):
+        # Waiting for a free connection happens before the send timestamp
+        protocol = await self.idle.get()
+        try:
+            reopened = protocol.lost or protocol.transport.is_closing()
+            if reopened:
+                if protocol in self.connections:
+                    self.connections.remove(protocol)
+                protocol = await self._open()
+            response = await protocol.request(self.request_bytes, self.timeout_seconds)
+            response.connection_reused = not reopened
+            return response
+        except BaseException:
+            # The connection may hold a half-read response; never reuse it
+            protocol.transport.close()
+            protocol.lost = True
+            raise
+        finally:
+            self.idle.put_nowait(protocol)
+
+    def close(self):
+        for protocol in self.connections:
+            if protocol.transport is not None:
+                protocol.transport.close()
+        self.connections = []
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import time
+from prettytable import PrettyTable
+from termcolor import colored
+from histogram import LatencyHistogram
+from latency_bot import create_probe_session, format_ms, measure_latency, measure_raw_latency, warm_up_session
+from mock_exchange import MockExchange
+from raw_http import RawHttpClient, server_time_from_response
+from targets import RESPONSE_PARSERS, load_targets
+
+# Self-check for the raw HTTP engine: probes the same endpoint through the aiohttp
+# path and through raw_http.py, one probe at a time on a single warm connection,
+# and reports how much round-trip time and CPU per probe the raw engine saves.
+# Rounds alternate between the two paths so drift on the server side hits both.
+# With the built-in mock, CPU per probe includes the mock's share, which is the
+# same for both paths, so the difference is still the client-side saving.
+
+
+async def check_parsing(client, target):
+    # The in-place scan must agree with the full JSON parser on a real response
+    response = await client.request()
+    scanned = server_time_from_response(response, target['parser'])
+    parsed = RESPONSE_PARSERS[target['parser']](response.status, response.body())
+    return scanned == parsed, scanned, parsed
+
+
+async def run_path(probe, probes):
+    histogram = LatencyHistogram()
+    failures = 0
+    cpu_start_seconds = time.process_time()
+    for _ in range(probes):
+        result = await probe()
+        if result:
+            histogram.record(result['round_trip_time_ns'])
+        else:
+            failures += 1
+    return histogram, failures, time.process_time() - cpu_start_seconds
+
+
+async def self_check(url, probes, rounds):
+    target = load_targets({"targets": [{"name": "self-check", "url": url}], "number_of_checks": probes})[0]
+    results = {"aiohttp": [LatencyHistogram(), 0, 0.0], "raw": [LatencyHistogram(), 0, 0.0]}
+    client = RawHttpClient(url, pool_size=1)
+    async with create_probe_session('warm', 1) as session:
+        await warm_up_session(session, target, 1)
+        await client.connect()
+        try:
+            parsing_ok, scanned, parsed = await check_parsing(client, target)
+            paths = {
+                "aiohttp": lambda: measure_latency(session, url, parser=RESPONSE_PARSERS[target['parser']]),
+                "raw": lambda: measure_raw_latency(client, target),
+            }
+            for _ in range(rounds):
+                for name, probe in paths.items():
+                    histogram, failures, cpu_seconds = await run_path(probe, probes // rounds)
+                    results[name][0].merge(histogram)
+                    results[name][1] += failures
+                    results[name][2] += cpu_seconds
+        finally:
+            client.close()
+    return parsing_ok, scanned, parsed, results
+
+
+def print_self_check(parsing_ok, scanned, parsed, results):
+    print(colored(f"timeNano scan {'matches' if parsing_ok else 'DOES NOT match'} the JSON parser ({scanned} vs {parsed})",
+                  "green" if parsing_ok else "red"))
+    table = PrettyTable()
+    table.field_names = ["Path", "Probes", "Failed", "Average (ms)", "p50 (ms)", "p99 (ms)", "Max (ms)", "CPU per Probe (us)"]
+    summaries = {}
+    for name, (histogram, failures, cpu_seconds) in results.items():
+        p50, p99 = histogram.percentiles([50, 99])
+        cpu_per_probe_us = cpu_seconds / max(histogram.count + failures, 1) * 1e6
+        summaries[name] = (histogram.mean(), p50, p99, cpu_per_probe_us)
+        table.add_row([name, histogram.count, failures, format_ms(histogram.mean()), format_ms(p50), format_ms(p99),
+                       format_ms(histogram.max_ns), f"{cpu_per_probe_us:.0f}"])
+    print(colored(table, "yellow"))
+    if all(summary[0] is not None for summary in summaries.values()):
+        saved = [aiohttp_value - raw_value for aiohttp_value, raw_value in zip(summaries["aiohttp"], summaries["raw"])]
+        print(colored(f"Client overhead removed by the raw engine: {format_ms(saved[1])} ms at p50, {format_ms(saved[2])} ms at p99, "
+                      f"{saved[3]:.0f} us CPU per probe", "cyan"))
+
+
+async def main(args):
+    exchange = None
+    url = args.url
+    if url is None:
+        exchange = MockExchange()
+        await exchange.start(port=args.port)
+        url = f"http://127.0.0.1:{args.port}/v5/market/time"
+    try:
+        return await self_check(url, args.probes, args.rounds)
+    finally:
+        if exchange is not None:
+            await exchange.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the raw HTTP engine with the aiohttp probe path")
+    parser.add_argument('--url', help="endpoint to probe (default: a local mock exchange)")
+    parser.add_argument('--port', type=int, default=18765, help="port for the local mock exchange")
+    parser.add_argument('--probes', type=int, default=2000, help="probes per path")
+    parser.add_argument('--rounds', type=int, default=4, help="alternating rounds the probes are split into")
+    arguments = parser.parse_args()
+    print_self_check(*asyncio.run(main(arguments)))
@@ -0,0 +1,428 @@
+import argparse
+import json
+import os
+import re
+from datetime import datetime, timezone
+import numpy as np
+from prettytable import PrettyTable
+from timing import wall_clock_ns
+
+# On-disk layout of a store directory:
+#   store.json          metric columns, target/mode name <-> id tables, rollup watermarks
+#   <column>.col        one fixed-width little-endian array per column, appended in
+#                       timestamp order, so any column can be np.memmap'ed and a time
+#                       range found with a binary search on timestamp_ns.col
+#   rollup_<res>.bin    fixed-width rollup records per (bucket, target, mode)
+# Missing metrics (e.g. DNS on a reused connection, or a failed probe) are stored as MISSING.
+MISSING = np.iinfo(np.int64).min
+KEY_COLUMNS = {"timestamp_ns": np.dtype('<i8'), "target_id": np.dtype('<u2'), "mode_id": np.dtype('<u1'), "ok": np.dtype('<u1')}
+_LABEL_COLUMNS = {"targets": "target_id", "modes": "mode_id"}
+METRIC_DTYPE = np.dtype('<i8')
+DEFAULT_ROLLUP_METRIC = "round_trip_time_ns"
+
+ROLLUP_RESOLUTIONS_NS = {"1s": 1_000_000_000, "1m": 60_000_000_000, "1h": 3_600_000_000_000}
+# 1s rollups keep count/sum/min/max only, which keeps them small enough to write
+# every second; 1m and 1h rollups also carry a histogram so percentiles can be
+# answered from them. The histogram has 1/8-octave buckets (~9% wide) from
+# 1 us (2**10 ns) to ~68 s (2**36 ns).
+HISTOGRAM_RESOLUTIONS = ("1m", "1h")
+ROLLUP_BUCKETS_PER_OCTAVE = 8
+ROLLUP_MIN_EXPONENT = 10
+ROLLUP_MAX_EXPONENT = 36
+ROLLUP_BUCKETS = (ROLLUP_MAX_EXPONENT - ROLLUP_MIN_EXPONENT) * ROLLUP_BUCKETS_PER_OCTAVE
+_ROLLUP_FIELDS = [('bucket_start_ns', '<i8'), ('target_id', '<u2'), ('mode_id', '<u1'), ('count', '<u4'),
+                  ('failures', '<u4'), ('sum_ns', '<i8'), ('min_ns', '<i8'), ('max_ns', '<i8')]
+ROLLUP_DTYPES = {
+    "1s": np.dtype(_ROLLUP_FIELDS),
+    "1m": np.dtype(_ROLLUP_FIELDS + [('histogram', '<u4', (ROLLUP_BUCKETS,))]),
+    "1h": np.dtype(_ROLLUP_FIELDS + [('histogram', '<u4', (ROLLUP_BUCKETS,))]),
+}
+ROLLUP_BUCKET_VALUES_NS = 2.0 ** ((np.arange(ROLLUP_BUCKETS) + 0.5) / ROLLUP_BUCKETS_PER_OCTAVE + ROLLUP_MIN_EXPONENT)
+
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9]
+WRITE_BATCH_SIZE = 4096
+
+
+def rollup_bucket_indices(values_ns):
+    values = np.maximum(np.asarray(values_ns, dtype=np.float64), 1.0)
+    indices = np.floor((np.log2(values) - ROLLUP_MIN_EXPONENT) * ROLLUP_BUCKETS_PER_OCTAVE)
+    return np.clip(indices, 0, ROLLUP_BUCKETS - 1).astype(np.int64)
+
+
+class _RollupBuilder:
+    # Rows are additive, so a bucket flushed early (on close) and completed by a
+    # later process simply ends up as two rows that queries sum up.
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.resolution_ns = ROLLUP_RESOLUTIONS_NS[resolution]
+        self.dtype = ROLLUP_DTYPES[resolution]
+        self.open_rows = {}
+        self.current_bucket_ns = None
+
+    def add(self, timestamp_ns, target_id, mode_id, value_ns):
+        bucket_ns = timestamp_ns // self.resolution_ns * self.resolution_ns
+        completed = []
+        if self.current_bucket_ns is not None and bucket_ns > self.current_bucket_ns:
+            completed = self.take_rows()
+        self.current_bucket_ns = bucket_ns
+        key = (bucket_ns, target_id, mode_id)
+        row = self.open_rows.get(key)
+        if row is None:
+            row = self.open_rows[key] = np.zeros((), dtype=self.dtype)
+            row['bucket_start_ns'], row['target_id'], row['mode_id'] = key
+            row['min_ns'], row['max_ns'] = np.iinfo(np.int64).max, MISSING
+        if value_ns is None:
+            row['failures'] += 1
+        else:
+            row['count'] += 1
+            row['sum_ns'] += value_ns
+            row['min_ns'] = min(int(row['min_ns']), value_ns)
+            row['max_ns'] = max(int(row['max_ns']), value_ns)
+            if 'histogram' in self.dtype.names:
+                row['histogram'][rollup_bucket_indices(value_ns)] += 1
+        return completed
+
+    def take_rows(self):
+        rows = [self.open_rows[key] for key in sorted(self.open_rows)]
+        self.open_rows = {}
+        return rows
+
+
+class SampleStore:
+    """Append-only writer. `append` matches the sample sink signature of perform_latency_checks_async."""
+
+    def __init__(self, path, metrics, rollup_metric=DEFAULT_ROLLUP_METRIC):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.metadata = _load_metadata(path) or {
+            "metrics": list(metrics), "targets": [], "modes": [], "rollup_metric": rollup_metric, "watermarks": {},
+        }
+        # The schema is fixed when the store is created; new metrics are not added to old stores
+        self.metrics = self.metadata["metrics"]
+        self.rollup_metric = self.metadata["rollup_metric"]
+        self.columns = {**KEY_COLUMNS, **{metric: METRIC_DTYPE for metric in self.metrics}}
+        self.last_timestamp_ns = self._repair()
+        self.pending = {column: [] for column in self.columns}
+        self.rollups = {resolution: _RollupBuilder(resolution) for resolution in ROLLUP_RESOLUTIONS_NS}
+        self.pending_rollups = {resolution: [] for resolution in ROLLUP_RESOLUTIONS_NS}
+        self.watermarks = dict(self.metadata["watermarks"])
+        _save_metadata(path, self.metadata)
+
+    def _repair(self):
+        # A crash can leave columns of different lengths; cut them back to the shortest
+        rows = min(_column_rows(self.path, column, dtype) for column, dtype in self.columns.items())
+        for column, dtype in self.columns.items():
+            column_path = _column_path(self.path, column)
+            if os.path.exists(column_path) and os.path.getsize(column_path) != rows * dtype.itemsize:
+                with open(column_path, 'r+b') as f:
+                    f.truncate(rows * dtype.itemsize)
+        # ... and a torn rollup record would misalign every record after it
+        for resolution, dtype in ROLLUP_DTYPES.items():
+            rollup_path = _rollup_path(self.path, resolution)
+            if os.path.exists(rollup_path) and os.path.getsize(rollup_path) % dtype.itemsize:
+                with open(rollup_path, 'r+b') as f:
+                    f.truncate(os.path.getsize(rollup_path) // dtype.itemsize * dtype.itemsize)
+        if not rows:
+            return MISSING
+        timestamps = np.memmap(_column_path(self.path, "timestamp_ns"), dtype=KEY_COLUMNS["timestamp_ns"], mode='r')
+        return int(timestamps[rows - 1])
+
+    def _label_id(self, kind, name):
+        labels = self.metadata[kind]
+        if name not in labels:
+            # Checked before anything is queued, so a rejected sample leaves the columns aligned
+            if len(labels) > np.iinfo(KEY_COLUMNS[_LABEL_COLUMNS[kind]]).max:
+                raise ValueError(f"Sample store {self.path} already holds {len(labels)} {kind}, the most its ids can address")
+            labels.append(name)
+            _save_metadata(self.path, self.metadata)
+        return labels.index(name)
+
+    def append(self, target, mode, result):
+        # Timestamps must never go backwards, or binary searches over the columns break
+        timestamp_ns = max(result.get('timestamp_ns', wall_clock_ns()) if result else wall_clock_ns(), self.last_timestamp_ns)
+        self.last_timestamp_ns = timestamp_ns
+        target_id = self._label_id("targets", target)
+        mode_id = self._label_id("modes", mode)
+        self.pending["timestamp_ns"].append(timestamp_ns)
+        self.pending["target_id"].append(target_id)
+        self.pending["mode_id"].append(mode_id)
+        self.pending["ok"].append(1 if result else 0)
+        for metric in self.metrics:
+            value = result.get(metric) if result else None
+            self.pending[metric].append(MISSING if value is None else int(value))
+
+        rollup_value = result.get(self.rollup_metric) if result else None
+        # Samples that carry other metrics only (e.g. WebSocket delivery delays) stay out of the rollups
+        if rollup_value is not None or not result:
+            for resolution, builder in self.rollups.items():
+                self.pending_rollups[resolution].extend(
+                    builder.add(timestamp_ns, target_id, mode_id, None if rollup_value is None else int(rollup_value)))
+                self.watermarks[resolution] = builder.current_bucket_ns
+
+        if len(self.pending["timestamp_ns"]) >= WRITE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        for column, dtype in self.columns.items():
+            if self.pending[column]:
+                with open(_column_path(self.path, column), 'ab') as f:
+                    f.write(np.asarray(self.pending[column], dtype=dtype).tobytes())
+                self.pending[column] = []
+        for resolution, rows in self.pending_rollups.items():
+            if rows:
+                with open(_rollup_path(self.path, resolution), 'ab') as f:
+                    f.write(np.concatenate([row.reshape(1) for row in rows]).tobytes())
+                self.pending_rollups[resolution] = []
+        # Watermarks go last: a reader must never trust a rollup that is not on disk yet
+        self.metadata["watermarks"] = dict(self.watermarks)
+        _save_metadata(self.path, self.metadata)
+
+    def close(self):
+        # Partial buckets are written out without moving the watermarks, so queries keep
+        # answering the open buckets from raw samples until a later run completes them
+        for resolution, builder in self.rollups.items():
+            self.pending_rollups[resolution].extend(builder.take_rows())
+        self.flush()
+
+
+class SampleReader:
+    def __init__(self, path):
+        self.path = path
+        self.metadata = _load_metadata(path)
+        if self.metadata is None:
+            raise FileNotFoundError(f"No sample store at {path}")
+        self.columns = {**KEY_COLUMNS, **{metric: METRIC_DTYPE for metric in self.metadata["metrics"]}}
+        self.rows = min(_column_rows(path, column, dtype) for column, dtype in self.columns.items())
+
+    def label_ids(self, kind, names):
+        labels = self.metadata[kind]
+        if not names:
+            return list(range(len(labels)))
+        unknown = [name for name in names if name not in labels]
+        if unknown:
+            raise ValueError(f"Unknown {kind} {unknown}, the store has {labels}")
+        return [labels.index(name) for name in names]
+
+    def _column(self, column):
+        if not self.rows:
+            return np.zeros(0, dtype=self.columns[column])
+        return np.memmap(_column_path(self.path, column), dtype=self.columns[column], mode='r', shape=(self.rows,))
+
+    def raw_values(self, metric, start_ns, end_ns, target_ids, mode_ids):
+        # Returns (values, failures) for [start_ns, end_ns); only the rows in range are touched
+        if metric not in self.columns:
+            raise ValueError(f"Unknown metric '{metric}', the store has {self.metadata['metrics']}")
+        timestamps = self._column("timestamp_ns")
+        first, last = np.searchsorted(timestamps, [start_ns, end_ns], side='left')
+        selected = (np.isin(self._column("target_id")[first:last], target_ids)
+                    & np.isin(self._column("mode_id")[first:last], mode_ids))
+        values = np.asarray(self._column(metric)[first:last])[selected]
+        ok = np.asarray(self._column("ok")[first:last])[selected]
+        return values[values != MISSING], int(np.count_nonzero(ok == 0))
+
+    def rollup_rows(self, resolution, start_ns, end_ns, target_ids, mode_ids):
+        rollup_path = _rollup_path(self.path, resolution)
+        dtype = ROLLUP_DTYPES[resolution]
+        rows = os.path.getsize(rollup_path) // dtype.itemsize if os.path.exists(rollup_path) else 0
+        if not rows:
+            return np.zeros(0, dtype=dtype)
+        records = np.memmap(rollup_path, dtype=dtype, mode='r', shape=(rows,))
+        first, last = np.searchsorted(records['bucket_start_ns'], [start_ns, end_ns], side='left')
+        records = records[first:last]
+        return records[np.isin(records['target_id'], target_ids) & np.isin(records['mode_id'], mode_ids)]
+
+    def query_plan(self, start_ns, end_ns):
+        # Whole hours come from 1h rollups, whole minutes around them from 1m rollups and
+        # the sub-minute edges from raw samples; rollups are only used below their watermark
+        watermarks = self.metadata["watermarks"]
+
+        def split(start_ns, end_ns, resolutions):
+            if start_ns >= end_ns:
+                return []
+            if not resolutions:
+                return [("raw", start_ns, end_ns)]
+            resolution_ns = ROLLUP_RESOLUTIONS_NS[resolutions[0]]
+            first = -(-start_ns // resolution_ns) * resolution_ns
+            last = min(end_ns, watermarks.get(resolutions[0]) or MISSING) // resolution_ns * resolution_ns
+            if first >= last:
+                return split(start_ns, end_ns, resolutions[1:])
+            return split(start_ns, first, resolutions[1:]) + [(resolutions[0], first, last)] + split(last, end_ns, resolutions[1:])
+
+        return split(start_ns, end_ns, list(reversed(HISTOGRAM_RESOLUTIONS)))
+
+    def query(self, metric, start_ns, end_ns, targets=None, modes=None, percentiles=DEFAULT_PERCENTILES):
+        target_ids = self.label_ids("targets", targets)
+        mode_ids = self.label_ids("modes", modes)
+        plan = self.query_plan(start_ns, end_ns) if metric == self.metadata["rollup_metric"] else [("raw", start_ns, end_ns)]
+
+        if all(source == "raw" for source, _, _ in plan):
+            # Exact answer straight from the samples
+            values, failures = self.raw_values(metric, start_ns, end_ns, target_ids, mode_ids)
+            if not len(values):
+                return _empty_summary(failures, percentiles, "raw")
+            return {
+                "count": len(values), "failures": failures, "mean_ns": float(values.mean()),
+                "percentiles_ns": [float(value) for value in np.percentile(values, percentiles)],
+                "min_ns": int(values.min()), "max_ns": int(values.max()), "source": "raw",
+            }
+
+        histogram = np.zeros(ROLLUP_BUCKETS, dtype=np.int64)
+        count = failures = total_ns = 0
+        min_ns, max_ns = None, None
+        for source, part_start_ns, part_end_ns in plan:
+            if source == "raw":
+                values, part_failures = self.raw_values(metric, part_start_ns, part_end_ns, target_ids, mode_ids)
+                np.add.at(histogram, rollup_bucket_indices(values), 1)
+                part = (len(values), part_failures, int(values.sum()),
+                        int(values.min()) if len(values) else None, int(values.max()) if len(values) else None)
+            else:
+                rows = self.rollup_rows(source, part_start_ns, part_end_ns, target_ids, mode_ids)
+                histogram += rows['histogram'].sum(axis=0, dtype=np.int64)
+                with_values = rows[rows['count'] > 0]
+                part = (int(rows['count'].sum()), int(rows['failures'].sum()), int(rows['sum_ns'].sum()),
+                        int(with_values['min_ns'].min()) if len(with_values) else None,
+                        int(with_values['max_ns'].max()) if len(with_values) else None)
+            count, failures, total_ns = count + part[0], failures + part[1], total_ns + part[2]
+            if part[3] is not None:
+                min_ns = part[3] if min_ns is None else min(min_ns, part[3])
+                max_ns = part[4] if max_ns is None else max(max_ns, part[4])
+
+        sources = "+".join(dict.fromkeys(source for source, _, _ in plan))
+        if not count:
+            return _empty_summary(failures, percentiles, sources)
+        cumulative = np.cumsum(histogram)
+        ranks = np.ceil(np.asarray(percentiles, dtype=np.float64) / 100 * count).clip(1, count)
+        estimates = ROLLUP_BUCKET_VALUES_NS[np.searchsorted(cumulative, ranks)]
+        return {
+            "count": count, "failures": failures, "mean_ns": total_ns / count,
+            "percentiles_ns": [float(min(max(estimate, min_ns), max_ns)) for estimate in estimates],
+            "min_ns": min_ns, "max_ns": max_ns, "source": sources,
+        }
+
+    def series(self, resolution, start_ns, end_ns, targets=None, modes=None):
+        rows = self.rollup_rows(resolution, start_ns, end_ns, self.label_ids("targets", targets), self.label_ids("modes", modes))
+        # A bucket that was open when the writer closed is written again, partially, by the
+        # next run; fold those rows back into one per (bucket, target, mode)
+        merged = {}
+        for row in rows:
+            key = (int(row['bucket_start_ns']), int(row['target_id']), int(row['mode_id']))
+            if key not in merged:
+                merged[key] = row.copy()
+                continue
+            into = merged[key]
+            if row['count'] and into['count']:
+                into['min_ns'] = min(into['min_ns'], row['min_ns'])
+                into['max_ns'] = max(into['max_ns'], row['max_ns'])
+            elif row['count']:
+                into['min_ns'], into['max_ns'] = row['min_ns'], row['max_ns']
+            for field in ('count', 'failures', 'sum_ns') + (('histogram',) if 'histogram' in rows.dtype.names else ()):
+                into[field] += row[field]
+        return np.array(list(merged.values()), dtype=rows.dtype)
+
+
+def _empty_summary(failures, percentiles, source):
+    return {"count": 0, "failures": failures, "mean_ns": None, "percentiles_ns": [None] * len(percentiles),
+            "min_ns": None, "max_ns": None, "source": source}
+
+
+def _column_path(path, column):
+    return os.path.join(path, f"{column}.col")
+
+
+def _rollup_path(path, resolution):
+    return os.path.join(path, f"rollup_{resolution}.bin")
+
+
+def _column_rows(path, column, dtype):
+    column_path = _column_path(path, column)
+    return os.path.getsize(column_path) // dtype.itemsize if os.path.exists(column_path) else 0
+
+
+def _load_metadata(path):
+    metadata_path = os.path.join(path, "store.json")
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path, 'r') as f:
+        return json.load(f)
+
+
+def _save_metadata(path, metadata):
+    # Write-then-rename so a reader never sees a half-written file
+    metadata_path = os.path.join(path, "store.json")
+    with open(metadata_path + ".tmp", 'w') as f:
+        json.dump(metadata, f)
+    os.replace(metadata_path + ".tmp", metadata_path)
+
+
+def parse_time(value, now_ns=None):
+    # "now", a relative age such as "90s", "15m", "6h" or "7d", or an ISO 8601 timestamp (UTC if no zone)
+    now_ns = wall_clock_ns() if now_ns is None else now_ns
+    if value == "now":
+        return now_ns
+    relative = re.fullmatch(r'(\d+(?:\.\d+)?)([smhd])', value)
+    if relative:
+        unit_ns = {"s": 1e9, "m": 60e9, "h": 3600e9, "d": 86400e9}[relative.group(2)]
+        return now_ns - int(float(relative.group(1)) * unit_ns)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp()) * 1_000_000_000 + moment.microsecond * 1000
+
+
+def format_ns_as_ms(value_ns):
+    return "-" if value_ns is None else f"{value_ns / 1e6:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the latency sample store")
+    parser.add_argument('--path', default='samples', help="sample store directory")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = subcommands.add_parser('query', help="percentiles over a time range, one row per target and mode")
+    series_parser = subcommands.add_parser('series', help="rollup rows over a time range")
+    for subcommand in (query_parser, series_parser):
+        subcommand.add_argument('--start', default='1h', help="ISO timestamp or age such as 15m, 6h, 7d (default 1h)")
+        subcommand.add_argument('--end', default='now', help="ISO timestamp, age or 'now' (default now)")
+        subcommand.add_argument('--target', action='append', help="target name, repeatable (default all)")
+        subcommand.add_argument('--mode', action='append', help="probe mode, repeatable (default all)")
+    query_parser.add_argument('--metric', default=DEFAULT_ROLLUP_METRIC)
+    query_parser.add_argument('--percentile', type=float, action='append', help="repeatable (default 50, 90, 99, 99.9)")
+    query_parser.add_argument('--combined', action='store_true', help="one row across all selected targets and modes")
+    series_parser.add_argument('--resolution', choices=list(ROLLUP_RESOLUTIONS_NS), default='1m')
+    args = parser.parse_args()
+
+    reader = SampleReader(args.path)
+    now_ns = wall_clock_ns()
+    start_ns, end_ns = parse_time(args.start, now_ns), parse_time(args.end, now_ns)
+    targets = args.target or reader.metadata["targets"]
+    modes = args.mode or reader.metadata["modes"]
+
+    if args.command == 'query':
+        percentiles = args.percentile or DEFAULT_PERCENTILES
+        table = PrettyTable()
+        table.field_names = ["Target", "Mode", "Count", "Failed", "Average (ms)"] + [f"p{percentile:g} (ms)" for percentile in percentiles] + ["Max (ms)", "Source"]
+        selections = [("+".join(targets), "+".join(modes), targets, modes)] if args.combined else \
+            [(target, mode, [target], [mode]) for target in targets for mode in modes]
+        for target_label, mode_label, selected_targets, selected_modes in selections:
+            summary = reader.query(args.metric, start_ns, end_ns, selected_targets, selected_modes, percentiles)
+            if not summary["count"] and not summary["failures"]:
+                continue
+            table.add_row([target_label, mode_label, summary["count"], summary["failures"], format_ns_as_ms(summary["mean_ns"])]
+                          + [format_ns_as_ms(value) for value in summary["percentiles_ns"]] + [format_ns_as_ms(summary["max_ns"]), summary["source"]])
+        print(table)
+    else:
+        rows = reader.series(args.resolution, start_ns, end_ns, targets, modes)
+        table = PrettyTable()
+        table.field_names = ["Bucket (UTC)", "Target", "Mode", "Count", "Failed", "Average (ms)", "Min (ms)", "Max (ms)"]
+        for row in rows:
+            count = int(row['count'])
+            table.add_row([datetime.fromtimestamp(int(row['bucket_start_ns']) / 1e9, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                           reader.metadata["targets"][row['target_id']], reader.metadata["modes"][row['mode_id']], count, int(row['failures']),
+                           format_ns_as_ms(int(row['sum_ns']) / count if count else None),
+                           format_ns_as_ms(int(row['min_ns']) if count else None), format_ns_as_ms(int(row['max_ns']) if count else None)])
+        print(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import random
+from timing import monotonic_ns
+
+# Cycles run on a fixed grid of monotonic deadlines, so the time a cycle takes
+# does not push later cycles back, and each wake-up is jittered around its grid
+# point so probes do not stay phase-locked with periodic jobs on the exchange side.
+# In adaptive mode the interval halves on every degraded cycle, down to a floor
+# set by `min_interval_seconds` and by the request and CPU budgets, and doubles
+# back towards `scheduling_frequency_seconds` after `calm_cycles` calm ones.
+DEFAULT_SCHEDULER = {
+    "jitter_fraction": 0.1,
+    "adaptive": True,
+    "min_interval_seconds": 5,
+    # A cycle is degraded when a target's p99 round trip exceeds this multiple of its
+    # calm baseline, or more than `max_failure_share` of its probes fail
+    "degradation_ratio": 1.5,
+    "max_failure_share": 0.1,
+    "calm_cycles": 3,
+    # Budgets the fastest interval must stay within
+    "max_requests_per_minute": 120,
+    "max_busy_fraction": 0.5,
+}
+# Weight of the newest calm cycle in a target's baseline p99
+BASELINE_WEIGHT = 0.2
+
+
+class AdaptiveScheduler:
+    def __init__(self, base_interval_seconds, settings=None):
+        self.settings = {**DEFAULT_SCHEDULER, **(settings or {})}
+        self.base_interval_ns = int(base_interval_seconds * 1e9)
+        self.interval_ns = self.base_interval_ns
+        self.grid_ns = monotonic_ns()
+        self.calm_streak = 0
+        self.baselines = {}
+        self.skipped_ticks = 0
+
+    def _floor_ns(self, probes, busy_ns):
+        floor_ns = self.settings['min_interval_seconds'] * 1e9
+        if self.settings['max_requests_per_minute']:
+            floor_ns = max(floor_ns, probes * 60e9 / self.settings['max_requests_per_minute'])
+        if self.settings['max_busy_fraction']:
+            floor_ns = max(floor_ns, busy_ns / self.settings['max_busy_fraction'])
+        return int(min(floor_ns, self.base_interval_ns))
+
+    def degraded_keys(self, stats_by_target):
+        degraded = []
+        for target, stats_by_mode in stats_by_target.items():
+            for mode, stats in stats_by_mode.items():
+                key = (target, mode)
+                probes = stats.count + stats.failures
+                if probes and stats.failures / probes > self.settings['max_failure_share']:
+                    degraded.append(key)
+                    continue
+                histogram = stats.histograms['round_trip_time_ns']
+                if not histogram.count:
+                    continue
+                p99_ns = histogram.percentile(99)
+                baseline_ns = self.baselines.get(key)
+                if baseline_ns is not None and p99_ns > self.settings['degradation_ratio'] * baseline_ns:
+                    degraded.append(key)
+                else:
+                    # Only calm cycles move the baseline, so it does not follow an incident up
+                    self.baselines[key] = p99_ns if baseline_ns is None else baseline_ns + BASELINE_WEIGHT * (p99_ns - baseline_ns)
+        return degraded
+
+    def observe(self, stats_by_target, busy_ns, regressions=()):
+        """Adapt the interval to one finished cycle; `busy_ns` is how long the cycle took.
+
+        `regressions` are (target, mode) pairs flagged elsewhere during the cycle, e.g. by
+        the change-point detector, and count as degraded too.
+        """
+        if not self.settings['adaptive']:
+            return []
+        probes = sum(stats.count + stats.failures for stats_by_mode in stats_by_target.values() for stats in stats_by_mode.values())
+        floor_ns = self._floor_ns(probes, busy_ns)
+        degraded = self.degraded_keys(stats_by_target)
+        degraded += [key for key in regressions if key not in degraded]
+        if degraded:
+            self.calm_streak = 0
+            interval_ns = max(self.interval_ns // 2, floor_ns)
+        else:
+            self.calm_streak += 1
+            interval_ns = self.interval_ns
+            if self.calm_streak >= self.settings['calm_cycles']:
+                self.calm_streak = 0
+                interval_ns = min(self.interval_ns * 2, self.base_interval_ns)
+        # The budgets hold even when nothing changed, e.g. after cycles got slower
+        interval_ns = max(interval_ns, floor_ns)
+        if interval_ns != self.interval_ns:
+            logging.info(f"Check interval {self.interval_ns / 1e9:.1f} s -> {interval_ns / 1e9:.1f} s "
+                         f"(degraded: {', '.join(f'{target}/{mode}' for target, mode in degraded) or 'none'})")
+            self.interval_ns = interval_ns
+        return degraded
+
+    def next_wake_ns(self):
+        # Next grid point still ahead; grid points a long cycle ran past are skipped, not made up
+        now_ns = monotonic_ns()
+        self.grid_ns += self.interval_ns
+        if self.grid_ns <= now_ns:
+            missed = (now_ns - self.grid_ns) // self.interval_ns + 1
+            self.skipped_ticks += missed
+            logging.warning(f"Check cycle overran its interval, skipping {missed} tick(s)")
+            self.grid_ns += missed * self.interval_ns
+        jitter_ns = int(random.uniform(-1, 1) * self.settings['jitter_fraction'] * self.interval_ns)
+        return max(self.grid_ns + jitter_ns, now_ns)
+
+    async def wait(self):
+        wake_ns = self.next_wake_ns()
+        await asyncio.sleep((wake_ns - monotonic_ns()) / 1e9)
@@ -0,0 +1,60 @@
+import ipaddress
+import socket
+import struct
+from prettytable import PrettyTable
+from termcolor import colored
+from histogram import mann_whitney_u
+
+# The "sources" probe mode runs warm probes to a target from every local address
+# in `source_addresses` at the same time, each through its own pool bound to that
+# address, so multi-homed hosts can compare uplinks under the same conditions.
+# An entry can also name an interface (e.g. "eth1"), which is bound through its
+# IPv4 address. Results are reported as mode "source <entry>".
+SOURCE_MODE_PREFIX = "source "
+# Differences with a Mann-Whitney p-value below this are marked significant
+SIGNIFICANCE_LEVEL = 0.01
+# ioctl returning the IPv4 address of an interface (Linux)
+_SIOCGIFADDR = 0x8915
+
+
+def source_mode(address):
+    return f"{SOURCE_MODE_PREFIX}{address}"
+
+
+def source_address(entry):
+    # The local address to bind for a `source_addresses` entry
+    try:
+        return str(ipaddress.ip_address(entry))
+    except ValueError:
+        pass
+    import fcntl
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        request = fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, struct.pack('256s', entry.encode()[:15]))
+    return socket.inet_ntoa(request[20:24])
+
+
+def print_source_comparison(target_name, stats_by_mode):
+    sources = [(mode[len(SOURCE_MODE_PREFIX):], stats) for mode, stats in stats_by_mode.items() if mode.startswith(SOURCE_MODE_PREFIX)]
+    answered = [source for source in sources if source[1].count]
+    if not answered:
+        return
+    # Every path is compared against the one with the lowest median round trip
+    best_address, best_stats = min(answered, key=lambda source: source[1].histograms['round_trip_time_ns'].percentile(50))
+    best_histogram = best_stats.histograms['round_trip_time_ns']
+    table = PrettyTable()
+    table.field_names = ["Source Address", "Probes", "Failed", "p50 (ms)", "p99 (ms)", "p50 vs Best (ms)", "p-value", "Significant"]
+    for address, stats in sources:
+        histogram = stats.histograms['round_trip_time_ns']
+        if not stats.count:
+            table.add_row([address, 0, stats.failures, "-", "-", "-", "-", "-"])
+            continue
+        p50_ns, p99_ns = histogram.percentiles([50, 99])
+        if address == best_address:
+            delta, p_value, significant = "best", "-", "-"
+        else:
+            delta = f"+{(p50_ns - best_histogram.percentile(50)) / 1e6:.2f}"
+            _, _, p = mann_whitney_u(histogram, best_histogram)
+            p_value, significant = f"{p:.3g}", "yes" if p < SIGNIFICANCE_LEVEL else "no"
+        table.add_row([address, stats.count, stats.failures, f"{p50_ns / 1e6:.2f}", f"{p99_ns / 1e6:.2f}", delta, p_value, significant])
+    print(colored(f"{target_name} · source addresses side by side (Mann-Whitney U against the best)", "blue"))
+    print(colored(table, "green"))
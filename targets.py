@@ -0,0 +1,93 @@
+import json
+from urllib.parse import urlparse
+
+# "warm" probes reuse a pre-warmed keep-alive pool (what the order gateway sees),
+# "cold" probes open a fresh connection, DNS lookup included, for every request,
+# "open_loop" probes hit the warm pool at a constant rate set by `load_test`,
+# "websocket" probes ping over a persistent connection to `ws_url` (see ws_probe.py),
+# "raw" probes reuse pre-opened connections of the minimal client in raw_http.py,
+# "edges" probes run warm probes against every resolved address of the host (see edges.py),
+# "sources" probes run warm probes from every local address in `source_addresses` (see sources.py)
+PROBE_MODES = ["warm", "cold", "open_loop", "websocket", "raw", "edges", "sources"]
+DEFAULT_PROBE_MODES = ["warm", "cold"]
+DEFAULT_LOAD_TEST = {"rate_per_second": 200, "duration_seconds": 10, "max_in_flight": 64, "late_threshold_ms": 1}
+DEFAULT_WEBSOCKET = {"ping_rate_per_second": 5, "duration_seconds": 10, "ping_timeout_seconds": 5, "subscribe": []}
+# `static_hosts` ({host: [addresses]}) stands in for DNS, e.g. to test against local addresses
+DEFAULT_EDGES = {"dns_ttl_seconds": 300, "ipv6": True, "static_hosts": {}}
+
+# Returned by parsers for endpoints that carry no exchange timestamp: the probe
+# still counts, but only round-trip and phase timings can be reported
+NO_SERVER_TIME = object()
+
+
+def parse_bybit_time(status, body):
+    response_json = json.loads(body)
+    if 'result' in response_json and 'timeNano' in response_json['result']:
+        return int(response_json['result']['timeNano'])
+    raise ValueError("Key 'timeNano' not found in the response.")
+
+
+def parse_binance_time(status, body):
+    # {"serverTime": 1499827319559}
+    return int(json.loads(body)['serverTime']) * 1_000_000
+
+
+def parse_okx_time(status, body):
+    # {"code": "0", "data": [{"ts": "1597026383085"}]}
+    return int(json.loads(body)['data'][0]['ts']) * 1_000_000
+
+
+def parse_http_status(status, body):
+    # Order endpoints answer 4xx without credentials, which still exercises the
+    # whole exchange edge; only server-side errors count as failed probes
+    if status >= 500:
+        raise ValueError(f"Server error HTTP {status}")
+    return NO_SERVER_TIME
+
+
+RESPONSE_PARSERS = {
+    "bybit_time": parse_bybit_time,
+    "binance_time": parse_binance_time,
+    "okx_time": parse_okx_time,
+    "status": parse_http_status,
+}
+
+
+def load_targets(config):
+    # Without a `targets` list the legacy single `api_endpoint` becomes the only target
+    target_entries = config.get('targets') or [{"url": config['api_endpoint']}]
+    targets = []
+    for entry in target_entries:
+        target = {
+            "name": entry.get('name', urlparse(entry['url']).netloc),
+            "url": entry['url'],
+            "parser": entry.get('parser', 'bybit_time'),
+            "number_of_checks": entry.get('number_of_checks', config['number_of_checks']),
+            "probe_modes": entry.get('probe_modes', config.get('probe_modes', DEFAULT_PROBE_MODES)),
+            "load_test": {**DEFAULT_LOAD_TEST, **config.get('load_test', {}), **entry.get('load_test', {})},
+            "ws_url": entry.get('ws_url'),
+            "websocket": {**DEFAULT_WEBSOCKET, **config.get('websocket', {}), **entry.get('websocket', {})},
+            "edges": {**DEFAULT_EDGES, **config.get('edges', {}), **entry.get('edges', {})},
+            "source_addresses": entry.get('source_addresses', config.get('source_addresses', [])),
+        }
+        if 'rate_per_second' in entry:
+            target['load_test']['rate_per_second'] = entry['rate_per_second']
+        target['concurrency'] = entry.get('concurrency', target['number_of_checks'])
+        target['max_connections'] = entry.get('max_connections', target['concurrency'])
+
+        if target['parser'] not in RESPONSE_PARSERS:
+            raise ValueError(f"Unknown parser '{target['parser']}' for target '{target['name']}', expected one of {list(RESPONSE_PARSERS)}")
+        for mode in target['probe_modes']:
+            if mode not in PROBE_MODES:
+                raise ValueError(f"Unknown probe mode '{mode}' for target '{target['name']}', expected one of {PROBE_MODES}")
+        if 'websocket' in target['probe_modes'] and not target['ws_url']:
+            raise ValueError(f"Target '{target['name']}' uses the websocket probe mode but has no 'ws_url'")
+        # Only open-loop probes are paced; warm and cold probes go out in one burst of `concurrency`
+        if 'rate_per_second' in entry and 'open_loop' not in target['probe_modes']:
+            raise ValueError(f"Target '{target['name']}' sets 'rate_per_second', which only applies to the open_loop probe mode")
+        if 'sources' in target['probe_modes'] and not target['source_addresses']:
+            raise ValueError(f"Target '{target['name']}' uses the sources probe mode but has no 'source_addresses'")
+        if any(existing['name'] == target['name'] for existing in targets):
+            raise ValueError(f"Duplicate target name '{target['name']}'")
+        targets.append(target)
+    return targets
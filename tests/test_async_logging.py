@@ -0,0 +1,14 @@
+import logging
+import queue
+from async_logging import DeferredQueueHandler
+
+
+def test_queued_arguments_are_snapshotted():
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("test_async_logging")
+    logger.propagate = False
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    results = {"round_trip_time_ns": 1}
+    logger.warning("Latency measurement results: %s", results)
+    results['intended_latency_ns'] = 2
+    assert log_queue.get_nowait().getMessage() == "Latency measurement results: {'round_trip_time_ns': 1}"
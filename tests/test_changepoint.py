@@ -0,0 +1,20 @@
+from changepoint import ChangePointMonitor
+
+
+def test_delivery_only_samples_are_skipped():
+    monitor = ChangePointMonitor({"incident_dir": None})
+    monitor.record("bybit", "websocket", {"timestamp_ns": 1, "delivery_delay_ns": 2_000_000})
+    assert monitor.detectors == {}
+
+    monitor.record("bybit", "websocket", {"timestamp_ns": 2, "round_trip_time_ns": 3_000_000})
+    monitor.record("bybit", "websocket", None)
+    assert [sample[1] for sample in monitor.recent[("bybit", "websocket")]] == [3_000_000, None]
+
+
+def test_reused_edge_slot_starts_a_new_baseline():
+    monitor = ChangePointMonitor({"incident_dir": None, "warmup_samples": 20})
+    for i in range(100):
+        monitor.record("bybit", "edge #1", {"timestamp_ns": i, "round_trip_time_ns": 2_000_000 + i % 7 * 10_000, "edge_address": "10.0.0.1"})
+    for i in range(100):
+        monitor.record("bybit", "edge #1", {"timestamp_ns": 100 + i, "round_trip_time_ns": 9_000_000 + i % 7 * 10_000, "edge_address": "10.0.0.2"})
+    assert monitor.take_regressions() == []
@@ -0,0 +1,34 @@
+import asyncio
+import os
+import pytest
+from diagnostics import run_network_diagnostics_async
+from hops import parse_diagnostic_output
+from timing import monotonic_ns
+
+FAKE_MTR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fake_mtr.sh")
+
+
+def test_stand_in_command_is_run_for_the_host():
+    results = asyncio.run(run_network_diagnostics_async("https://exchange.test/v5/market/time", {"mtr": [FAKE_MTR, "{host}"]}, 10))
+    assert [result['error'] for result in results] == [None]
+    records = parse_diagnostic_output("mtr", results[0]['stdout'])
+    assert [record.host for record in records] == ["192.168.1.1", "exchange.test"]
+
+
+def test_slow_stand_in_is_killed_on_timeout():
+    results = asyncio.run(run_network_diagnostics_async("exchange.test", {"mtr": [FAKE_MTR, "{host}", "30"]}, 0.2))
+    assert results[0]['error'] == "timed out after 0.2s"
+    assert results[0]['elapsed_ns'] < 5e9
+
+
+def test_cancellation_does_not_wait_for_the_stand_in():
+    async def cancel_diagnostics():
+        task = asyncio.create_task(run_network_diagnostics_async("exchange.test", {"mtr": [FAKE_MTR, "{host}", "30"]}, 60))
+        await asyncio.sleep(0.2)
+        start_ns = monotonic_ns()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return monotonic_ns() - start_ns
+
+    assert asyncio.run(cancel_diagnostics()) < 5e9
@@ -0,0 +1,45 @@
+import asyncio
+import socket
+from edges import AddressCache, rank_edges
+from latency_bot import perform_edge_checks_async
+from mock_exchange import MockExchange
+from targets import load_targets
+
+EDGE_ADDRESSES = ["127.0.0.1", "127.0.0.2"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_edges_are_probed_through_static_hosts_on_loopback():
+    port = free_port()
+    config = {"targets": [{"name": "edge-test", "url": f"http://exchange.test:{port}/v5/market/time", "probe_modes": ["edges"]}],
+              "number_of_checks": 5, "edges": {"static_hosts": {"exchange.test": EDGE_ADDRESSES}}}
+    target = load_targets(config)[0]
+    samples = []
+
+    async def probe_edges():
+        mocks = [MockExchange() for _ in EDGE_ADDRESSES]
+        for mock, address in zip(mocks, EDGE_ADDRESSES):
+            await mock.start(address, port)
+        try:
+            return await perform_edge_checks_async(target, lambda *sample: samples.append(sample))
+        finally:
+            for mock in mocks:
+                await mock.stop()
+
+    stats_by_mode = asyncio.run(probe_edges())
+    assert sorted(address for address, stats in rank_edges(stats_by_mode) if stats.count == 5) == EDGE_ADDRESSES
+    # Sinks see bounded slot labels, with the address in the sample
+    assert {(mode, result['edge_address']) for _, mode, result in samples} == {("edge #1", "127.0.0.1"), ("edge #2", "127.0.0.2")}
+
+
+def test_rotated_addresses_reuse_freed_slots():
+    cache = AddressCache(static_hosts={"exchange.test": ["10.0.0.1", "10.0.0.2"]})
+    asyncio.run(cache.resolve("exchange.test", 80))
+    cache.static_hosts["exchange.test"] = ["10.0.0.3", "10.0.0.2"]
+    asyncio.run(cache.resolve("exchange.test", 80))
+    assert (cache.slot("exchange.test", "10.0.0.3"), cache.slot("exchange.test", "10.0.0.2")) == (1, 2)
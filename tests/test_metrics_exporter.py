@@ -0,0 +1,30 @@
+import metrics_exporter
+from metrics_exporter import MetricsExporter
+
+
+def sample(value_ns, error_ns):
+    return {"timestamp_ns": 1, "round_trip_time_ns": 2_000_000, "server_to_exchange_ns": value_ns,
+            "clock_offset_ns": 500_000, "offset_error_ns": error_ns}
+
+
+def test_one_way_quantiles_and_offset_error_follow_recent_probes(monkeypatch):
+    exporter = MetricsExporter(["round_trip_time_ns", "server_to_exchange_ns"])
+    now_ns = [0]
+    monkeypatch.setattr(metrics_exporter, "monotonic_ns", lambda: now_ns[0])
+    for _ in range(100):
+        exporter.record("bybit", "warm", sample(1_000_000, 5_000_000))
+    now_ns[0] = (metrics_exporter.ONE_WAY_WINDOW_SECONDS + 1) * 10**9
+    for _ in range(10):
+        exporter.record("bybit", "warm", sample(-40_000_000, 200_000))
+
+    lines = exporter.render().splitlines()
+    assert 'latencygroove_one_way_delay_seconds{target="bybit",mode="warm",phase="server_to_exchange",quantile="0.5"} -0.04' in lines
+    assert 'latencygroove_clock_offset_error_seconds{target="bybit",mode="warm"} 0.0002' in lines
+    assert not any(line.startswith('latencygroove_probe_latency_seconds_sum') and 'server_to_exchange' in line for line in lines)
+
+
+def test_reused_edge_slot_resets_its_series():
+    exporter = MetricsExporter(["round_trip_time_ns"])
+    for address in ("10.0.0.1", "10.0.0.1", "10.0.0.2"):
+        exporter.record("bybit", "edge #1", {"timestamp_ns": 1, "round_trip_time_ns": 2_000_000, "edge_address": address})
+    assert exporter.stats[("bybit", "edge #1")].count == 1
@@ -0,0 +1,37 @@
+import asyncio
+import socket
+from latency_bot import measure_raw_latency
+from mock_exchange import MockExchange
+from raw_http import RawHttpClient
+from targets import load_targets
+from timing import ClockOffsetEstimator
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_reopened_connection_is_not_counted_as_reused():
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/v5/market/time"
+    target = load_targets({"targets": [{"name": "raw-test", "url": url}], "number_of_checks": 1})[0]
+
+    async def run():
+        mock = MockExchange()
+        await mock.start("127.0.0.1", port)
+        client = RawHttpClient(url)
+        try:
+            await client.connect()
+            first = await measure_raw_latency(client, target, ClockOffsetEstimator())
+            client.connections[0].transport.close()
+            await asyncio.sleep(0.05)
+            reopened = await measure_raw_latency(client, target, ClockOffsetEstimator())
+            after = await measure_raw_latency(client, target, ClockOffsetEstimator())
+            return [result['connection_reused'] for result in (first, reopened, after)]
+        finally:
+            client.close()
+            await mock.stop()
+
+    assert asyncio.run(run()) == [True, False, True]
@@ -0,0 +1,27 @@
+import os
+from sample_store import ROLLUP_DTYPES, SampleReader, SampleStore, _rollup_path
+
+METRICS = ["round_trip_time_ns"]
+
+
+def write_samples(path, start_ns, count):
+    store = SampleStore(path, METRICS)
+    for i in range(count):
+        store.append("bybit", "warm", {"timestamp_ns": start_ns + i * 500_000_000, "round_trip_time_ns": 2_000_000})
+    store.close()
+
+
+def test_torn_rollup_record_is_cut_on_open(tmp_path):
+    path = str(tmp_path / "store")
+    write_samples(path, 10**18, 10)
+    rollup_path = _rollup_path(path, "1s")
+    records = os.path.getsize(rollup_path) // ROLLUP_DTYPES["1s"].itemsize
+    with open(rollup_path, 'ab') as f:
+        f.write(b"\x01" * (ROLLUP_DTYPES["1s"].itemsize // 2))
+
+    write_samples(path, 10**18 + 10 * 500_000_000, 10)
+    assert os.path.getsize(rollup_path) % ROLLUP_DTYPES["1s"].itemsize == 0
+    rows = SampleReader(path).rollup_rows("1s", 0, 2 * 10**18, [0], [0])
+    assert len(rows) > records
+    assert set(rows['target_id']) == {0} and set(rows['count']) <= {1, 2}
+    assert int(rows['count'].sum()) == 20
@@ -0,0 +1,53 @@
+import asyncio
+import socket
+from histogram import LatencyHistogram, mann_whitney_u
+from latency_bot import perform_source_checks_async
+from mock_exchange import MockExchange
+from sources import source_mode
+from targets import load_targets
+
+
+def histogram(values_ns):
+    result = LatencyHistogram()
+    for value_ns in values_ns:
+        result.record(value_ns)
+    return result
+
+
+def test_mann_whitney_u_matches_exact_u():
+    # Values below 256 ns have a bucket each, so the histogram U is exact
+    first = [10, 20, 30, 40, 40, 70]
+    second = [15, 25, 35, 40, 50, 60, 80]
+    exact_u = sum(1.0 if x > y else 0.5 if x == y else 0.0 for x in first for y in second)
+    u, z, p = mann_whitney_u(histogram(first), histogram(second))
+    assert u == exact_u
+    assert z < 0 and 0 < p < 1
+    assert mann_whitney_u(histogram(second), histogram(first))[0] == len(first) * len(second) - exact_u
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_sources_probe_from_loopback_aliases():
+    port = free_port()
+    entries = ["127.0.0.1", "127.0.0.2", "no-such-interface0"]
+    config = {"targets": [{"name": "source-test", "url": f"http://127.0.0.1:{port}/v5/market/time", "probe_modes": ["sources"],
+                           "source_addresses": entries}], "number_of_checks": 5}
+    target = load_targets(config)[0]
+    samples = []
+
+    async def probe_sources():
+        mock = MockExchange()
+        await mock.start("127.0.0.1", port)
+        try:
+            return await perform_source_checks_async(target, lambda *sample: samples.append(sample))
+        finally:
+            await mock.stop()
+
+    stats_by_mode = asyncio.run(probe_sources())
+    assert {mode: stats.count for mode, stats in stats_by_mode.items()} == {
+        source_mode("127.0.0.1"): 5, source_mode("127.0.0.2"): 5, source_mode("no-such-interface0"): 0}
+    assert {mode for _, mode, _ in samples} == {source_mode("127.0.0.1"), source_mode("127.0.0.2")}
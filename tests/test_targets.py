@@ -0,0 +1,10 @@
+import pytest
+from targets import load_targets
+
+
+def test_rate_per_second_needs_the_open_loop_mode():
+    entry = {"name": "bybit", "url": "https://api.bybit.com/v5/market/time", "rate_per_second": 50}
+    with pytest.raises(ValueError, match="open_loop"):
+        load_targets({"targets": [{**entry, "probe_modes": ["warm", "cold"]}], "number_of_checks": 5})
+    target = load_targets({"targets": [{**entry, "probe_modes": ["warm", "open_loop"]}], "number_of_checks": 5})[0]
+    assert target['load_test']['rate_per_second'] == 50
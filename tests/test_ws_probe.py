@@ -0,0 +1,66 @@
+import asyncio
+import socket
+from mock_exchange import MockExchange, parse_latency
+from ws_probe import WebSocketProbe
+
+PONG_DELAY_MS = 20
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def ping_after_keepalive(echo_req_id):
+    async def run():
+        port = free_port()
+        mock = MockExchange(latency=parse_latency(f"constant:{PONG_DELAY_MS}"), echo_req_id=echo_req_id)
+        await mock.start("127.0.0.1", port)
+        probe = WebSocketProbe(f"ws://127.0.0.1:{port}/v5/public/linear")
+        try:
+            await probe.connect()
+            await probe._send_keepalive()
+            results = [await probe.ping(5) for _ in range(3)]
+            return results, list(probe.sent)
+        finally:
+            await probe.close()
+            await mock.stop()
+    return asyncio.run(run())
+
+
+def test_keepalive_pong_without_req_id_does_not_answer_a_ping():
+    results, sent = ping_after_keepalive(echo_req_id=False)
+    # The mock answers one request at a time, so the first ping waits behind the keepalive's pong
+    assert results[0]['round_trip_time_ns'] >= 1.5 * PONG_DELAY_MS * 1e6
+    assert all(result['round_trip_time_ns'] >= 0.9 * PONG_DELAY_MS * 1e6 for result in results[1:])
+    assert sent == []
+
+
+def test_echoed_req_ids_are_matched():
+    results, sent = ping_after_keepalive(echo_req_id=True)
+    assert all(result['round_trip_time_ns'] >= 0.9 * PONG_DELAY_MS * 1e6 for result in results)
+    assert sent == []
+
+
+def test_ping_after_a_lost_pong_is_matched():
+    async def run():
+        port = free_port()
+        mock = MockExchange(latency=parse_latency(f"constant:{PONG_DELAY_MS}"), echo_req_id=False)
+        await mock.start("127.0.0.1", port)
+        probe = WebSocketProbe(f"ws://127.0.0.1:{port}/v5/public/linear")
+        try:
+            await probe.connect()
+            mock.error_rate = 1.0
+            lost = await probe.ping(0.2)
+            mock.error_rate = 0.0
+            results = [await probe.ping(5) for _ in range(2)]
+            return lost, results, list(probe.sent)
+        finally:
+            await probe.close()
+            await mock.stop()
+
+    lost, results, sent = asyncio.run(run())
+    assert lost is None
+    assert all(result is not None and result['round_trip_time_ns'] >= 0.9 * PONG_DELAY_MS * 1e6 for result in results)
+    assert sent == []
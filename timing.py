@@ -0,0 +1,63 @@
+import time
+from collections import deque
+
+# perf_counter_ns is monotonic with nanosecond resolution but has an arbitrary
+# epoch, so it is anchored to time_ns once at import. Every timestamp taken
+# through this module is therefore monotonic *and* comparable with the
+# exchange's timeNano; any drift of the anchor is absorbed by the offset
+# estimator below.
+_WALL_ANCHOR_NS = time.time_ns()
+_MONOTONIC_ANCHOR_NS = time.perf_counter_ns()
+
+
+def monotonic_ns():
+    return time.perf_counter_ns()
+
+
+def to_wall_clock_ns(monotonic_timestamp_ns):
+    return _WALL_ANCHOR_NS + (monotonic_timestamp_ns - _MONOTONIC_ANCHOR_NS)
+
+
+def wall_clock_ns():
+    return to_wall_clock_ns(time.perf_counter_ns())
+
+
+class ClockOffsetEstimator:
+    """NTP-style estimate of (exchange clock - local clock) over a sliding window.
+
+    A probe sent at t0 and answered at t3 with server timestamp T tells us the
+    offset lies in [T - t3, T - t0]. The estimate intersects those intervals for
+    the lowest-RTT samples in the window (least queueing, tightest bounds) and
+    falls back to the single best sample when they disagree, e.g. after a step
+    of either clock.
+    """
+
+    def __init__(self, window_size=256, best_samples=8):
+        self.samples = deque(maxlen=window_size)
+        self.best_samples = best_samples
+
+    def add_sample(self, local_send_ns, server_time_ns, local_receive_ns):
+        self.samples.append((local_receive_ns - local_send_ns, server_time_ns - local_receive_ns,
+                             server_time_ns - local_send_ns))
+
+    def estimate(self):
+        if not self.samples:
+            return None
+        best = sorted(self.samples)[:self.best_samples]
+        lower = max(sample[1] for sample in best)
+        upper = min(sample[2] for sample in best)
+        if lower > upper:
+            _, lower, upper = best[0]
+        return (lower + upper) / 2, (upper - lower) / 2
+
+    def correct(self, local_send_ns, server_time_ns, local_receive_ns):
+        """Feed one probe and return its offset-corrected one-way latencies."""
+        self.add_sample(local_send_ns, server_time_ns, local_receive_ns)
+        offset_ns, error_ns = self.estimate()
+        server_time_local_ns = server_time_ns - offset_ns
+        return {
+            "server_to_exchange_ns": server_time_local_ns - local_send_ns,
+            "exchange_to_server_ns": local_receive_ns - server_time_local_ns,
+            "clock_offset_ns": offset_ns,
+            "offset_error_ns": error_ns,
+        }
@@ -0,0 +1,59 @@
+import aiohttp
+from timing import wall_clock_ns
+
+# Phase name -> table label, in the order the phases happen on the wire.
+# aiohttp does not expose the TLS handshake separately from the TCP connect,
+# so "connect" covers both for https endpoints.
+PHASES = {
+    "pool_wait_ns": "Pool Wait",
+    "dns_ns": "DNS Lookup",
+    "connect_ns": "TCP+TLS Connect",
+    "ttfb_ns": "Time to First Byte",
+    "body_ns": "Body Transfer",
+}
+
+
+def _stamp(key):
+    async def on_event(session, trace_config_ctx, params):
+        timings = trace_config_ctx.trace_request_ctx
+        if timings is not None:
+            timings[key] = wall_clock_ns()
+    return on_event
+
+
+def create_phase_trace_config():
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_stamp('request_start_ns'))
+    trace_config.on_connection_queued_start.append(_stamp('queued_start_ns'))
+    trace_config.on_connection_queued_end.append(_stamp('queued_end_ns'))
+    trace_config.on_connection_create_start.append(_stamp('connect_start_ns'))
+    trace_config.on_dns_resolvehost_start.append(_stamp('dns_start_ns'))
+    trace_config.on_dns_resolvehost_end.append(_stamp('dns_end_ns'))
+    trace_config.on_connection_create_end.append(_stamp('connect_end_ns'))
+    trace_config.on_connection_reuseconn.append(_stamp('connection_reused_ns'))
+    trace_config.on_request_headers_sent.append(_stamp('request_sent_ns'))
+    trace_config.on_request_end.append(_stamp('headers_received_ns'))
+    return trace_config
+
+
+def _elapsed(timings, start_key, end_key):
+    if start_key in timings and end_key in timings:
+        return timings[end_key] - timings[start_key]
+    return None
+
+
+def phase_durations(timings):
+    # DNS resolution happens inside connection creation, so it is subtracted
+    # from the connect phase rather than double counted.
+    dns_ns = _elapsed(timings, 'dns_start_ns', 'dns_end_ns')
+    connect_ns = _elapsed(timings, 'connect_start_ns', 'connect_end_ns')
+    if connect_ns is not None and dns_ns is not None:
+        connect_ns -= dns_ns
+    return {
+        "pool_wait_ns": _elapsed(timings, 'queued_start_ns', 'queued_end_ns'),
+        "dns_ns": dns_ns,
+        "connect_ns": connect_ns,
+        "ttfb_ns": _elapsed(timings, 'request_sent_ns', 'headers_received_ns'),
+        "body_ns": _elapsed(timings, 'headers_received_ns', 'body_end_ns'),
+        "connection_reused": 'connection_reused_ns' in timings,
+    }
@@ -5,10 +5,10 @@ import json
 import numpy as np
 import time
 from datetime import datetime
-import subprocess
-from urllib.parse import urlparse
 from termcolor import colored
 from prettytable import PrettyTable
+from diagnostics import DEFAULT_DIAGNOSTICS_TIMEOUT_SECONDS, BackgroundDiagnostics, run_network_diagnostics_async
+from hops import parse_diagnostic_output
 
 # Configure logging
 logging.basicConfig(filename='latency_checks.log', level=logging.INFO, 
@@ -51,32 +51,26 @@ def calculate_statistics(latencies):
         logging.info(table.get_string())
 
 async def schedule_checks_async(config):
+    # Diagnostics run next to the probes instead of blocking the loop between cycles
+    diagnostics = BackgroundDiagnostics()
     while True:
         print(colored("Starting scheduled latency checks...", "blue"))
         latencies = await perform_latency_checks_async(config)
         calculate_statistics(latencies)
         if config.get('enable_network_diagnostics', False):
-            run_network_diagnostics(config['api_endpoint'])
+            diagnostics.start(run_network_diagnostics(config['api_endpoint'], config))
         print(colored(f"Waiting {config['scheduling_frequency_seconds']} seconds before the next round of checks...", "magenta"))
         await asyncio.sleep(config['scheduling_frequency_seconds'])
 
-def run_network_diagnostics(target):
-    parsed_url = urlparse(target)
-    domain = parsed_url.netloc
+async def run_network_diagnostics(target, config):
     print(colored("Running network diagnostics...", "yellow"))
-
-    diagnostics = {
-        "ping": ["ping", "-c", "4", domain],
-        "traceroute": ["traceroute", domain],
-        "mtr": ["mtr", "--report", "--report-cycles", "1", domain]
-    }
-    for tool, command in diagnostics.items():
-        try:
-            print(colored(f"Executing {tool}...", "cyan"))
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            logging.info(f"{tool.upper()} Result: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error running {tool}: {e}\n{e.stderr}")
+    results = await run_network_diagnostics_async(target, config.get('diagnostic_commands'),
+                                                  config.get('diagnostics_timeout_seconds', DEFAULT_DIAGNOSTICS_TIMEOUT_SECONDS))
+    for result in results:
+        status = "done" if result['error'] is None else result['error']
+        print(colored(f"{result['tool']} {status} ({result['elapsed_ns'] / 1e9:.1f}s)", "cyan"))
+        for record in parse_diagnostic_output(result['tool'], result['stdout']):
+            logging.info(f"{result['tool'].upper()} hop {record.hop}: {record._asdict()}")
 
 if __name__ == '__main__':
     config = load_config()
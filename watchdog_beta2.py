@@ -1,18 +1,21 @@
-import aiohttp
 import asyncio
-from datetime import datetime
 import json
-import numpy as np
 from prettytable import PrettyTable
 from termcolor import colored
-from urllib.parse import urlparse
-import subprocess
-import re
 import logging
-
-# Configurazione del logging
-logging.basicConfig(filename='latency_checks.log', level=logging.INFO, 
-                    format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+from latency_bot import METRICS, build_statistics_table, close_websocket_probes, combine_sample_sinks, describe_probes, perform_latency_checks_async, print_target_summary
+from histogram import PERCENTILES, LatencyStats
+from targets import load_targets
+from edges import EDGE_MODE_PREFIX, print_edge_ranking
+from sources import print_source_comparison
+from diagnostics import DEFAULT_DIAGNOSTICS_TIMEOUT_SECONDS, BackgroundDiagnostics, diagnostics_host, run_network_diagnostics_async
+from hops import HopHistory, build_hop_table, parse_diagnostic_output
+from timing import monotonic_ns, wall_clock_ns
+from sample_store import SampleStore
+from metrics_exporter import DEFAULT_EXPORTER_HOST, DEFAULT_EXPORTER_PORT, MetricsExporter
+from scheduler import AdaptiveScheduler
+from changepoint import ChangePointMonitor
+from async_logging import NdjsonSampleWriter, start_logging
 
 def print_watchdog_logo():
     logo = '''
@@ -36,101 +39,49 @@ def load_config():
         print(colored("Loading configuration...", "yellow"))
         return json.load(f)
 
-async def fetch_server_time(session):
-    url = "https://api.bybit.com/v5/market/time"
-    async with session.get(url) as response:
-        response_json = await response.json()
-        if 'result' in response_json and 'timeNano' in response_json['result']:
-            server_time_nano = float(response_json['result']['timeNano'])
-            return server_time_nano
-        else:
-            print(colored("Key 'timeNano' not found in the response.", "red"))
-            return None
-
-async def measure_latency(session, url):
-    local_start_time_ns = datetime.utcnow().timestamp() * 1e9
-    server_time_ns = await fetch_server_time(session)
-    local_finish_time_ns = datetime.utcnow().timestamp() * 1e9
-
-    if server_time_ns:
-        round_trip_time_ns = local_finish_time_ns - local_start_time_ns
-        server_to_exchange_ns = server_time_ns - local_start_time_ns
-        exchange_to_server_ns = local_finish_time_ns - server_time_ns
-        return round_trip_time_ns, server_to_exchange_ns, exchange_to_server_ns
-    return None, None, None
-
-async def perform_latency_checks_async(config):
-    async with aiohttp.ClientSession() as session:
-        tasks = [measure_latency(session, config['api_endpoint']) for _ in range(config['number_of_checks'])]
-        results = await asyncio.gather(*tasks)
-        valid_results = [result for result in results if all(result)]
-        return valid_results
-
-def calculate_and_print_statistics(results):
-    if results:
-        # Unpack the results into separate lists
-        round_trip_times_ns, server_to_exchange_times_ns, exchange_to_server_times_ns = zip(*results)
-
-        # Prepare the table for display
-        table = PrettyTable()
-        table.field_names = ["Metric", "Average", "Median", "95th Percentile"]
-
-        # Iterate over each metric to calculate statistics, convert to ms, and add to table
-        for label, values_ns in zip(["Round Trip Time", "Server to Exchange", "Exchange to Server"],
-                                    [round_trip_times_ns, server_to_exchange_times_ns, exchange_to_server_times_ns]):
-            # Convert ns to ms and calculate statistics
-            values_ms = [value / 1e6 for value in values_ns]  # Convert from ns to ms
-            avg_ms = np.mean(values_ms)
-            median_ms = np.median(values_ms)
-            percentile_95_ms = np.percentile(values_ms, 95)
-
-            # Add the row to the table, with values rounded to 2 decimal places
-            table.add_row([label, f"{avg_ms:.2f} ms", f"{median_ms:.2f} ms", f"{percentile_95_ms:.2f} ms"])
-
+def calculate_and_print_statistics(stats, cumulative_stats, mode=None, target=None):
+    if stats.count:
         # Print the table with color
-        print(colored(table, "yellow"))
-
-        # For logging, calculate and log the full precision ns values
-        logging.info("Detailed Latency Measurements in Nanoseconds:")
-        for label, values_ns in zip(["Round Trip Time (ns)", "Server to Exchange (ns)", "Exchange to Server (ns)"],
-                                    [round_trip_times_ns, server_to_exchange_times_ns, exchange_to_server_times_ns]):
-            avg_ns = np.mean(values_ns)
-            median_ns = np.median(values_ns)
-            percentile_95_ns = np.percentile(values_ns, 95)
-
-            # Log the full precision ns values
-            logging.info(f"{label}: Average = {avg_ns} ns, Median = {median_ns} ns, 95th Percentile = {percentile_95_ns} ns")
-
-def run_network_diagnostics(target):
-    parsed_url = urlparse(target)
-    domain = parsed_url.netloc
-    print(colored("Running network diagnostics...", "yellow"))
-
-    diagnostics = {
-        "ping": ["ping", "-c", "4", domain],
-        "traceroute": ["traceroute", domain],
-        "mtr": ["mtr", "--report", "--report-cycles", "1", domain]
-    }
-
-    tests_run = 0
+        if mode:
+            print(colored(describe_probes(mode, target), "blue"))
+        print(colored(build_statistics_table(stats), "yellow"))
+        if stats.clock_offset_ns is not None:
+            print(colored(f"Clock offset (exchange - local): {stats.clock_offset_ns / 1e6:+.3f} ms ± {stats.offset_error_ns / 1e6:.3f} ms", "cyan"))
+
+        # For logging, log the full precision ns values for this cycle and since start
+        logging.info(f"Detailed Latency Measurements in Nanoseconds ({describe_probes(mode or 'all', target)}):")
+        for label, metric in zip(["Round Trip Time", "Server to Exchange", "Exchange to Server"], METRICS):
+            for scope, scope_stats in (("cycle", stats), ("since start", cumulative_stats)):
+                summary = scope_stats.summary(metric)
+                if summary is None:
+                    continue
+                percentiles = ", ".join(f"p{percentile:g} = {value:.0f} ns" for percentile, value in zip(PERCENTILES, summary[2:-1]))
+                logging.info(f"{label} (ns, {scope}): Count = {summary[0]}, Average = {summary[1]:.0f} ns, {percentiles}, Max = {summary[-1]} ns")
+        if stats.clock_offset_ns is not None:
+            logging.info(f"Clock offset (ns): {stats.clock_offset_ns} ns ± {stats.offset_error_ns} ns")
+
+async def run_network_diagnostics(host, config, hop_history, exporter=None):
+    print(colored(f"Running network diagnostics for {host}...", "yellow"))
+    results = await run_network_diagnostics_async(host, config.get('diagnostic_commands'),
+                                                  config.get('diagnostics_timeout_seconds', DEFAULT_DIAGNOSTICS_TIMEOUT_SECONDS))
+
+    tests_run = len(results)
     tests_passed = 0
-    ping_summary_ms = None
-
-    for tool, command in diagnostics.items():
-        try:
-            print(colored(f"Executing {tool}...", "cyan"))
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            logging.info(f"{tool.upper()} Result: {result.stdout}")
-            if result.returncode == 0:
-                tests_passed += 1
-                if tool == "ping":
-                    # Extract the average ping time in ms
-                    match = re.search(r'avg = (\d+.\d+)/', result.stdout)
-                    if match:
-                        ping_summary_ms = match.group(1)
-            tests_run += 1
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error running {tool}: {e}\n{e.stderr}")
+    ping_record = None
+    timestamp_ns = wall_clock_ns()
+    if exporter is not None:
+        exporter.record_diagnostics(host, results, timestamp_ns)
+
+    for result in results:
+        if result['error'] is None:
+            tests_passed += 1
+        # Partial output (e.g. a traceroute cut off by the timeout) is still worth keeping
+        records = parse_diagnostic_output(result['tool'], result['stdout'])
+        hop_history.add(host, result['tool'], records, timestamp_ns)
+        for record in records:
+            logging.info(f"{result['tool'].upper()} hop {record.hop} {host}: {record._asdict()}")
+        if result['tool'] == "ping" and records:
+            ping_record = records[0]
 
     # Summary for UI
     summary_status = "All tests passed" if tests_run == tests_passed else "Some tests failed"
@@ -138,25 +89,98 @@ def run_network_diagnostics(target):
     # Print summary
     summary_table = PrettyTable()
     summary_table.field_names = ["Metric", "Value"]
+    summary_table.add_row(["Host", host])
     summary_table.add_row(["Tests Executed", tests_run])
     summary_table.add_row(["Tests Passed", tests_passed])
     summary_table.add_row(["Summary Status", summary_status])
-    if ping_summary_ms:
-        summary_table.add_row(["Ping (avg ms)", ping_summary_ms])
+    if ping_record and ping_record.avg_ms is not None:
+        summary_table.add_row(["Ping (avg ms)", f"{ping_record.avg_ms:.2f}"])
+        summary_table.add_row(["Ping Loss (%)", f"{ping_record.loss_pct:.1f}"])
     print(colored(summary_table, "green"))
 
+    # Per-hop view from the richest path tool available, with the change against earlier runs
+    for tool in ("mtr", "traceroute"):
+        if hop_history.hops(host, tool):
+            print(colored(f"{host} · {tool} hops", "blue"))
+            print(colored(build_hop_table(hop_history, host, tool), "yellow"))
+            break
+
+async def run_all_network_diagnostics(hosts, config, hop_history, exporter=None):
+    await asyncio.gather(*[run_network_diagnostics(host, config, hop_history, exporter) for host in hosts])
+
 async def schedule_checks_async(config):
+    # Configurazione del logging: written in batches from a background thread (see async_logging.py)
+    start_logging('latency_checks.log', logging.INFO)
     print_watchdog_logo()
-    while True:
-        print(colored("Starting scheduled latency checks...", "blue"))
-        results = await perform_latency_checks_async(config)
-        calculate_and_print_statistics(results)
-        
-        # Assuming the 'api_endpoint' from the config can be used as the target for diagnostics
-        api_url = config.get('api_endpoint', '')
-        parsed_url = urlparse(api_url)
-        domain = parsed_url.netloc if parsed_url.netloc else 'api.bybit.com'  # Fallback domain if not parseable
-        run_network_diagnostics(domain)
-        
-        print(colored(f"Waiting {config['scheduling_frequency_seconds']} seconds before the next round of checks...", "magenta"))
-        await asyncio.sleep(config['scheduling_frequency_seconds'])
+    # Diagnostics run next to the probes instead of blocking the loop between cycles
+    diagnostics = BackgroundDiagnostics()
+    targets = load_targets(config)
+    diagnostics_hosts = sorted({diagnostics_host(target['url']) for target in targets})
+    target_hosts = {target['name']: diagnostics_host(target['url']) for target in targets}
+    hop_history = HopHistory()
+    # Histograms are fixed-size, so keeping every cycle since start costs no extra memory
+    cumulative_stats = {}
+    # Every probe also goes to disk, so history survives restarts (see sample_store.py)
+    store = SampleStore(config['sample_store_path'], METRICS) if config.get('sample_store_path') else None
+    # Optional /metrics endpoint for Prometheus, served from this same event loop
+    exporter_config = config.get('metrics_exporter')
+    exporter = MetricsExporter(METRICS, hop_history) if exporter_config else None
+    # With `change_detection` configured, diagnostics run only when a target's latency regresses
+    # (see changepoint.py) instead of after every cycle
+    monitor = None
+    if config.get('change_detection') is not None:
+        def on_regression(event):
+            print(colored(f"Latency regression ({event['kind']}) detected on {event['target']} ({event['mode']})", "red"))
+            if config.get('enable_network_diagnostics', True):
+                diagnostics.start(run_all_network_diagnostics([target_hosts[event['target']]], config, hop_history, exporter))
+        monitor = ChangePointMonitor(config['change_detection'], on_regression)
+    # Optional one-JSON-object-per-line copy of every probe, written off the event loop
+    ndjson = NdjsonSampleWriter(config['sample_ndjson_path']) if config.get('sample_ndjson_path') else None
+    sample_sink = combine_sample_sinks(store.append if store else None, exporter.record if exporter else None,
+                                       monitor.record if monitor else None, ndjson.record if ndjson else None)
+    # Cycles start on a fixed grid and come faster while latency is degraded (see scheduler.py)
+    scheduler = AdaptiveScheduler(config['scheduling_frequency_seconds'], config.get('scheduler'))
+    try:
+        if exporter:
+            await exporter.start(exporter_config.get('host', DEFAULT_EXPORTER_HOST), exporter_config.get('port', DEFAULT_EXPORTER_PORT))
+        while True:
+            print(colored("Starting scheduled latency checks...", "blue"))
+            cycle_start_ns = monotonic_ns()
+            stats_by_target = await perform_latency_checks_async(config, sample_sink)
+            degraded = scheduler.observe(stats_by_target, monotonic_ns() - cycle_start_ns,
+                                         monitor.take_regressions() if monitor else ())
+            if store:
+                store.flush()
+            for target, stats_by_mode in stats_by_target.items():
+                for mode, stats in stats_by_mode.items():
+                    cumulative = cumulative_stats.setdefault((target, mode), LatencyStats(METRICS)).merge(stats)
+                    calculate_and_print_statistics(stats, cumulative, mode, target)
+            # Edge addresses rotate; totals are only kept for the ones still answered, and
+            # only targets whose edges resolved this cycle are pruned
+            resolved = {target for target, stats_by_mode in stats_by_target.items() if any(mode.startswith(EDGE_MODE_PREFIX) for mode in stats_by_mode)}
+            for key in [key for key in cumulative_stats if key[0] in resolved and key[1].startswith(EDGE_MODE_PREFIX)
+                        and key[1] not in stats_by_target[key[0]]]:
+                del cumulative_stats[key]
+            print_target_summary(stats_by_target)
+            for target, stats_by_mode in stats_by_target.items():
+                print_edge_ranking(target, stats_by_mode)
+                print_source_comparison(target, stats_by_mode)
+
+            # One diagnostics round covers every distinct host among the targets
+            if config.get('enable_network_diagnostics', True) and monitor is None:
+                diagnostics.start(run_all_network_diagnostics(diagnostics_hosts, config, hop_history, exporter))
+
+            if degraded:
+                print(colored(f"Degraded latency on {', '.join(f'{target} ({mode})' for target, mode in degraded)}", "red"))
+            print(colored(f"Next round of checks every {scheduler.interval_ns / 1e9:.1f} seconds...", "magenta"))
+            await scheduler.wait()
+    finally:
+        await close_websocket_probes()
+        if exporter:
+            await exporter.stop()
+        if store:
+            store.close()
+        if monitor:
+            monitor.flush()
+        if ndjson:
+            ndjson.close()
@@ -0,0 +1,131 @@
+import aiohttp
+import asyncio
+import json
+import logging
+from collections import deque
+from timing import wall_clock_ns
+
+# Bybit drops public connections that stay silent for more than ~30 s
+KEEPALIVE_INTERVAL_SECONDS = 20
+_KEEPALIVE_REQ_ID = "keepalive"
+
+
+def is_pong(message):
+    # Spot answers {"op": "ping", "ret_msg": "pong", ...}, derivatives {"op": "pong", ...}
+    return message.get('op') == 'pong' or (message.get('op') == 'ping' and message.get('ret_msg') == 'pong')
+
+
+class WebSocketProbe:
+    """One persistent WebSocket connection per target, reused across cycles.
+
+    `ping()` times an app-level {"op": "ping"} round trip. Messages on the
+    subscribed topics are handed to `on_stream_message(topic, exchange_ts_ns,
+    receive_ns)` while it is set; receive times are taken before the JSON is parsed.
+    """
+
+    def __init__(self, url, subscribe=()):
+        self.url = url
+        self.subscribe = list(subscribe)
+        self.session = None
+        self.ws = None
+        self.reader = None
+        self.keepalive = None
+        self.pending = {}
+        # req_ids in send order, keepalives included, for endpoints that do not echo them
+        self.sent = deque()
+        self.next_req_id = 0
+        self.on_stream_message = None
+
+    @property
+    def connected(self):
+        return self.ws is not None and not self.ws.closed
+
+    async def connect(self):
+        if self.connected:
+            return
+        await self._close_connection()
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        logging.debug(f"Opening WebSocket connection to {self.url}")
+        self.ws = await self.session.ws_connect(self.url)
+        self.sent.clear()
+        if self.subscribe:
+            await self.ws.send_str(json.dumps({"op": "subscribe", "args": self.subscribe}))
+        self.reader = asyncio.create_task(self._read())
+        self.keepalive = asyncio.create_task(self._keep_alive())
+
+    async def _read(self):
+        try:
+            async for message in self.ws:
+                receive_ns = wall_clock_ns()
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                self._dispatch(json.loads(message.data), receive_ns)
+        except Exception as e:
+            logging.error(f"WebSocket connection to {self.url} failed: {e}")
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"WebSocket connection to {self.url} closed"))
+            self.pending.clear()
+
+    def _dispatch(self, message, receive_ns):
+        if is_pong(message):
+            # Pongs come back in order: one without a req_id answers the oldest request,
+            # and requests sent before an echoed req_id will not get a pong any more
+            req_id = message.get('req_id')
+            if req_id and req_id in self.sent:
+                while self.sent.popleft() != req_id:
+                    pass
+            elif not req_id and self.sent:
+                req_id = self.sent.popleft()
+            future = self.pending.pop(req_id, None)
+            if future is not None and not future.done():
+                future.set_result(receive_ns)
+        elif 'topic' in message and 'ts' in message and self.on_stream_message is not None:
+            self.on_stream_message(message['topic'], int(message['ts']) * 1_000_000, receive_ns)
+
+    async def _keep_alive(self):
+        while self.connected:
+            await asyncio.sleep(KEEPALIVE_INTERVAL_SECONDS)
+            if self.connected:
+                await self._send_keepalive()
+
+    async def _send_keepalive(self):
+        self.sent.append(_KEEPALIVE_REQ_ID)
+        await self.ws.send_str(json.dumps({"op": "ping", "req_id": _KEEPALIVE_REQ_ID}))
+
+    async def ping(self, timeout_seconds):
+        # Round trip in ns, or None if the pong did not come back in time
+        self.next_req_id += 1
+        req_id = str(self.next_req_id)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[req_id] = future
+        payload = json.dumps({"op": "ping", "req_id": req_id})
+        self.sent.append(req_id)
+        send_ns = wall_clock_ns()
+        try:
+            await self.ws.send_str(payload)
+            receive_ns = await asyncio.wait_for(future, timeout_seconds)
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logging.error(f"WebSocket ping to {self.url} failed: {e or 'timed out'}")
+            return None
+        finally:
+            if self.pending.pop(req_id, None) is not None and req_id in self.sent:
+                # A timed-out ping must not hold the head of the FIFO, or every later pong is off by one
+                self.sent.remove(req_id)
+        return {"timestamp_ns": receive_ns, "round_trip_time_ns": receive_ns - send_ns}
+
+    async def _close_connection(self):
+        for task in (self.reader, self.keepalive):
+            if task is not None:
+                task.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+        self.ws = self.reader = self.keepalive = None
+
+    async def close(self):
+        await self._close_connection()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None